@@ -0,0 +1,178 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, DenseRank
+
+from decisions.bulk import increment_field, update_field
+from decisions.cache import bump_data_version
+from decisions.models import Alternative, LPR, PairCompare, Result
+
+DOMINANT_RESULTS = ('>', '>=', '=')
+DOMINATED_RESULTS = ('<', '=')
+
+
+def is_dominant(result):
+    return result in DOMINANT_RESULTS
+
+
+def dominance(result):
+    """
+    Whether the first and whether the second alternative of a pair dominates or
+    equals the other one, as a (first, second) pair of 0/1.
+    """
+    return int(is_dominant(result)), int(result in DOMINATED_RESULTS)
+
+
+def dominance_counts(lpr_id=None, alternative_ids=None):
+    """
+    Number of other alternatives every alternative dominates or equals, per LPR,
+    as {(lpr_id, alternative_id): count}. A pair counts for its first alternative
+    on a dominant result and for its second one on a dominated result, with one
+    GROUP BY per side. Self comparisons are implicit and not counted.
+    """
+    comparisons = PairCompare.objects.exclude(first_alternative_id=F('second_alternative_id')).order_by()
+    if lpr_id is not None:
+        comparisons = comparisons.filter(lpr_id=lpr_id)
+    counts = defaultdict(int)
+    for field, results in (('first_alternative_id', DOMINANT_RESULTS), ('second_alternative_id', DOMINATED_RESULTS)):
+        side = comparisons
+        if alternative_ids is not None:
+            side = side.filter(**{'%s__in' % field: alternative_ids})
+        for row in side.values('lpr_id', field).annotate(weight=Count('id', filter=Q(result__in=results))):
+            counts[(row['lpr_id'], row[field])] += row['weight']
+    return dict(counts)
+
+
+def create_empty_results(lpr_ids=None, alternative_ids=None):
+    """
+    Insert a weight 0 Result row for every LPR and alternative pair of the given
+    LPRs and alternatives, all of them by default, that has none yet. An
+    alternative that dominates nobody keeps its row, so it is still ranked.
+    """
+    lprs = LPR.objects.all() if lpr_ids is None else LPR.objects.filter(id__in=lpr_ids)
+    alternatives = Alternative.objects.all() if alternative_ids is None else \
+        Alternative.objects.filter(id__in=alternative_ids)
+    lpr_ids = list(lprs.values_list('id', flat=True))
+    alternative_ids = list(alternatives.values_list('id', flat=True))
+    existing = set(Result.objects.filter(lpr_id__in=lpr_ids, alternative_id__in=alternative_ids).values_list(
+        'lpr_id', 'alternative_id'
+    ))
+    created = Result.objects.bulk_create([
+        Result(lpr_id=lpr_id, alternative_id=alternative_id, alternative_weight=0)
+        for lpr_id in lpr_ids
+        for alternative_id in alternative_ids
+        if (lpr_id, alternative_id) not in existing
+    ])
+    if created:
+        rank_results(lpr_ids=lpr_ids)
+    return len(created)
+
+
+def rank_results(lpr_ids=None):
+    """
+    Dense-rank alternatives inside every LPR by alternative weight, best first.
+    Returns the number of ranks changed.
+    """
+    results = Result.objects.all()
+    if lpr_ids is not None:
+        results = results.filter(lpr_id__in=lpr_ids)
+    ranked = results.annotate(
+        position=Window(
+            expression=DenseRank(),
+            partition_by=[F('lpr_id')],
+            order_by=F('alternative_weight').desc()
+        )
+    ).values_list('id', 'rank', 'position')
+    return update_field(Result, 'rank', {pk: position for pk, rank, position in ranked if rank != position})
+
+
+@transaction.atomic
+def rebuild_results():
+    """
+    Recompute the Result weight of every LPR and alternative from PairCompare.
+    Missing rows are inserted with one bulk insert, changed weights are written
+    with one UPDATE, and ranks are reassigned with a window function.
+    """
+    lpr_ids = list(LPR.objects.values_list('id', flat=True))
+    alternative_ids = list(Alternative.objects.values_list('id', flat=True))
+    counts = dominance_counts()
+
+    existing = {}
+    for pk, lpr_id, alternative_id, weight in Result.objects.values_list(
+            'id', 'lpr_id', 'alternative_id', 'alternative_weight'):
+        existing.setdefault((lpr_id, alternative_id), []).append((pk, weight))
+
+    created = []
+    changed = {}
+    for lpr_id in lpr_ids:
+        for alternative_id in alternative_ids:
+            weight = counts.get((lpr_id, alternative_id), 0)
+            rows = existing.get((lpr_id, alternative_id))
+            if rows is None:
+                created.append(Result(lpr_id=lpr_id, alternative_id=alternative_id, alternative_weight=weight))
+                continue
+            for pk, old_weight in rows:
+                if old_weight != weight:
+                    changed[pk] = weight
+
+    Result.objects.bulk_create(created)
+    update_field(Result, 'alternative_weight', changed)
+    reranked = rank_results()
+    refresh_group_weights()
+    if created or changed or reranked:
+        bump_data_version()
+    return len(created), len(changed)
+
+
+def refresh_group_weights():
+    """
+    Recompute every alternative's group weight: its Result weights summed over
+    all LPRs, each multiplied by the LPR rank. The group results of every LPR
+    change with them, so all data versions move when one does.
+    """
+    totals = dict(Result.objects.order_by().values('alternative_id').annotate(
+        total=Sum(F('alternative_weight') * Coalesce(F('lpr__rank'), 0))
+    ).values_list('alternative_id', 'total'))
+    if update_field(Alternative, 'group_weight', {
+        pk: totals.get(pk) or 0
+        for pk, group_weight in Alternative.objects.values_list('id', 'group_weight')
+        if group_weight != (totals.get(pk) or 0)
+    }):
+        bump_data_version()
+
+
+@transaction.atomic
+def adjust_results(lpr_id, deltas):
+    """
+    Apply {alternative_id: delta} dominance changes of one LPR to its Result rows,
+    the alternatives' group weights and the LPR's ranking.
+    Missing Result rows are only created for growing weights, from the stored
+    comparisons, so cascading deletes never recreate rows of a deleted object.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    lpr = LPR.objects.filter(id=lpr_id).values('rank').first()
+    if not deltas or lpr is None:
+        return
+    lpr_rank = lpr['rank'] or 0
+
+    existing = set(Result.objects.filter(lpr_id=lpr_id, alternative_id__in=list(deltas)).values_list(
+        'alternative_id', flat=True
+    ))
+    missing = set(Alternative.objects.filter(id__in=[pk for pk, delta in deltas.items() if delta > 0]).values_list(
+        'id', flat=True
+    )) - existing
+    group_deltas = {pk: deltas[pk] * lpr_rank for pk in existing}
+    if missing:
+        counts = dominance_counts(lpr_id=lpr_id, alternative_ids=missing)
+        weights = {pk: counts.get((lpr_id, pk), 0) for pk in missing}
+        Result.objects.bulk_create([
+            Result(lpr_id=lpr_id, alternative_id=pk, alternative_weight=weight) for pk, weight in weights.items()
+        ])
+        group_deltas.update({pk: weight * lpr_rank for pk, weight in weights.items()})
+
+    increment_field(Result.objects.filter(lpr_id=lpr_id), 'alternative_id', 'alternative_weight', {
+        pk: deltas[pk] for pk in existing
+    })
+    increment_field(Alternative.objects.all(), 'id', 'group_weight', group_deltas)
+    rank_results(lpr_ids=[lpr_id])
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DecisionsConfig(AppConfig):
     name = 'decisions'
+
+    def ready(self):
+        import decisions.signals  # noqa
@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, Value, When
+
+
+def update_field(model, field_name, values):
+    """
+    Write {pk: value} into one column of the model with a single UPDATE statement.
+    Rows sharing a value share one WHEN branch, so the statement grows with the
+    number of distinct values rather than with the number of rows.
+    """
+    if not values:
+        return 0
+    pks_by_value = defaultdict(list)
+    for pk, value in values.items():
+        pks_by_value[value].append(pk)
+    field = model._meta.get_field(field_name)
+    return model.objects.filter(pk__in=list(values)).update(**{
+        field_name: Case(
+            *[When(pk__in=pks, then=Value(value)) for value, pks in pks_by_value.items()],
+            output_field=field
+        )
+    })
+
+
+def increment_field(queryset, key, field_name, deltas):
+    """
+    Add {key value: delta} to one column, with one UPDATE per distinct delta.
+    """
+    keys_by_delta = defaultdict(list)
+    for value, delta in deltas.items():
+        if delta:
+            keys_by_delta[delta].append(value)
+    for delta, values in keys_by_delta.items():
+        queryset.filter(**{'%s__in' % key: values}).update(**{field_name: F(field_name) + delta})
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from decisions.models import LPR
+
+
+class LRUCache(object):
+    """
+    Thread-safe in-process cache keeping at most max_entries values, evicting
+    the least recently used one first. Values are computed outside of the lock,
+    so a slow computation does not block readers of other keys.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_set(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def discard(self, predicate):
+        """
+        Drop the entries whose key satisfies predicate.
+        """
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+result_cache = LRUCache(settings.RESULT_CACHE_SIZE)
+
+
+def cached_for_lpr(view, lpr, compute, *extra):
+    """
+    Value of compute() for the view and LPR, cached under (view, lpr id, data
+    version, *extra). Any change to the LPR's data bumps its version, so stale
+    entries are never read again and age out of the LRU.
+    """
+    return result_cache.get_or_set((view, lpr.id, lpr.data_version) + extra, compute)
+
+
+def bump_data_version(lpr_id=None):
+    """
+    Move the data version of the LPR, or of every LPR, forward with an UPDATE
+    that bypasses the LPR model signals.
+    """
+    lprs = LPR.objects.all() if lpr_id is None else LPR.objects.filter(id=lpr_id)
+    lprs.update(data_version=F('data_version') + 1)
+
+
+def lpr_rows(*columns, lpr_id=None):
+    """
+    Raw (id, *columns) rows of the LPRs, or of one LPR, ordered by id. A single
+    cursor query, cheap enough to run before deciding whether to answer at all.
+    """
+    sql = 'SELECT %s FROM %s' % (
+        ', '.join(connection.ops.quote_name(column) for column in ('id',) + columns),
+        connection.ops.quote_name(LPR._meta.db_table)
+    )
+    params = []
+    if lpr_id is not None:
+        sql += ' WHERE id = %s'
+        params.append(lpr_id)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + ' ORDER BY id', params)
+        return cursor.fetchall()
+
+
+def lprs_etag(view, *columns, lpr_id=None):
+    """
+    Strong ETag of the view over the given LPR columns, None when there is no such LPR.
+    """
+    rows = lpr_rows(*columns, lpr_id=lpr_id)
+    if lpr_id is not None and not rows:
+        return None
+    return '"%s-%s"' % (view, hashlib.md5(repr(rows).encode('utf-8')).hexdigest())
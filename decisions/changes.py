@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Max
+
+from decisions.bulk import update_field
+from decisions.models import LPR, PairChange
+
+
+@transaction.atomic
+def record_pair_changes(lpr_id, results, inferred=False):
+    """
+    Append {(first_id, second_id): result} writes of the LPR to the change feed
+    with one bulk insert, in canonical pair order.
+
+    The sequence numbers are ids, allocated at insert time. The LPR row is locked
+    first and stays locked until the transaction commits, so the changes of one
+    LPR commit in the order of their ids and a client never misses a smaller id
+    committed after a larger one.
+    """
+    list(LPR.objects.select_for_update().filter(id=lpr_id).values_list('id', flat=True))
+    PairChange.objects.bulk_create([
+        PairChange(lpr_id=lpr_id, first_alternative_id=first, second_alternative_id=second,
+                   result=result, inferred=inferred)
+        for (first, second), result in sorted(results.items())
+    ])
+
+
+def last_change(lpr_id):
+    return PairChange.objects.filter(lpr_id=lpr_id).aggregate(last=Max('id'))['last'] or 0
+
+
+def pair_changes_since(lpr, since, limit):
+    """
+    (changes, more) of the LPR after the since sequence number, oldest first, at
+    most limit of them, or None when the feed was pruned past since and the
+    client has to reload the whole matrix.
+    """
+    if since < lpr.changes_pruned_to:
+        return None
+    changes = list(PairChange.objects.filter(lpr=lpr, id__gt=since).order_by('id').values_list(
+        'id', 'first_alternative_id', 'second_alternative_id', 'result', 'inferred'
+    )[:limit + 1])
+    return changes[:limit], len(changes) > limit
+
+
+@transaction.atomic
+def prune_pair_changes(keep):
+    """
+    Keep the newest keep changes of the feed, and none of deleted LPRs. Every
+    LPR remembers the newest change pruned from it, so clients behind it are
+    told to resync. Returns the number of changes deleted.
+    """
+    deleted, _ = PairChange.objects.exclude(lpr_id__in=LPR.objects.values('id')).delete()
+    newest = PairChange.objects.aggregate(newest=Max('id'))['newest'] or 0
+    cutoff = newest - keep
+    if cutoff <= 0:
+        return deleted
+    pruned = PairChange.objects.filter(id__lte=cutoff)
+    update_field(LPR, 'changes_pruned_to', dict(
+        pruned.order_by().values('lpr_id').annotate(last=Max('id')).values_list('lpr_id', 'last')
+    ))
+    return deleted + pruned.delete()[0]
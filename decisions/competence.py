@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from decisions.matrix import index_pairs
+from decisions.models import LPRCompare
+
+CompetenceSolution = namedtuple('CompetenceSolution', ['weights', 'iterations', 'residual'])
+
+
+def load_compare_matrix(lpr_ids):
+    """
+    Load every LPRCompare with a single query into a sparse L x L matrix,
+    rows being the master LPR and columns the target LPR, in the order of lpr_ids.
+    """
+    size = len(lpr_ids)
+    rows = list(LPRCompare.objects.filter(result__isnull=False).values_list(
+        'master_lpr_id', 'target_lpr_id', 'result'
+    ))
+    if not rows or not size:
+        return sparse.csr_matrix((size, size))
+
+    masters, targets, results = zip(*rows)
+    row_index, column_index, found = index_pairs(lpr_ids, masters, targets)
+    return sparse.csr_matrix(
+        (np.asarray(results, dtype=np.float64)[found], (row_index[found], column_index[found])),
+        shape=(size, size)
+    )
+
+
+def _normalized(vector):
+    vector = np.asarray(vector, dtype=np.float64)
+    total = vector.sum()
+    if total <= 0:
+        return np.full(len(vector), 1.0 / len(vector)) if len(vector) else vector
+    return vector / total
+
+
+def solve_competence(matrix, initial=None, tolerance=None, max_iterations=None):
+    """
+    Power iteration for the competence of every LPR: each LPR's competence is
+    the sum of the marks it received, weighted by the competence of the LPRs
+    that gave them. The vector is normalized to sum 1 after every step, and
+    iteration stops once the L1 change drops below tolerance.
+    """
+    if tolerance is None:
+        tolerance = settings.LPR_RANK_TOLERANCE
+    if max_iterations is None:
+        max_iterations = settings.LPR_RANK_MAX_ITERATIONS
+    received = matrix.T.tocsr()
+    if initial is None or not np.any(initial):
+        initial = received.sum(axis=1).A1
+    weights = _normalized(initial)
+    residual = 0.0
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        updated = _normalized(received.dot(weights))
+        residual = float(np.abs(updated - weights).sum())
+        weights = updated
+        if residual < tolerance:
+            break
+    return CompetenceSolution(weights, iterations, residual)
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+import numpy as np
+
+from decisions.models import Alternative, Criteria, Vector
+
+CriteriaMatrix = namedtuple('CriteriaMatrix', ['alternative_ids', 'criterias', 'values'])
+
+
+def load_criteria_matrix(field='numeric_value', criterias=None, fill=np.nan, alternative_ids=None):
+    """
+    Load the alternatives x criteria matrix of mark values with a single Vector query.
+    Cells of alternatives without a mark for a criteria are set to fill.
+    alternative_ids, sorted, restricts the matrix to a block of alternatives;
+    their vectors are selected by id range.
+    """
+    if criterias is None:
+        criterias = Criteria.objects.all()
+    criterias = list(criterias)
+    vectors = Vector.objects.filter(mark__criteria__in=criterias)
+    if alternative_ids is None:
+        alternative_ids = list(Alternative.objects.order_by('id').values_list('id', flat=True))
+    elif len(alternative_ids):
+        vectors = vectors.filter(alternative_id__gte=int(alternative_ids[0]), alternative_id__lte=int(alternative_ids[-1]))
+    values = np.full((len(alternative_ids), len(criterias)), fill, dtype=np.float64)
+    rows = list(vectors.values_list('alternative_id', 'mark__criteria_id', 'mark__%s' % field))
+    if rows and criterias and len(alternative_ids):
+        alternative_keys, criteria_keys, marks = zip(*rows)
+        row_index, found = index_ids(alternative_ids, alternative_keys)
+        columns = {criteria.id: column for column, criteria in enumerate(criterias)}
+        column_index = np.fromiter((columns[key] for key in criteria_keys), dtype=np.int64, count=len(rows))
+        values[row_index[found], column_index[found]] = np.array(marks, dtype=np.float64)[found]
+    return CriteriaMatrix(alternative_ids, criterias, values)
+
+
+def index_ids(sorted_ids, keys):
+    """
+    Positions of keys in sorted_ids, and whether each key was found there.
+    """
+    positions = np.searchsorted(sorted_ids, keys).clip(0, len(sorted_ids) - 1)
+    return positions, np.asarray(sorted_ids)[positions] == np.asarray(keys)
+
+
+def oriented_values(matrix):
+    """
+    Values of the criteria with an optimal type, signed so that higher is always
+    better. Missing marks are ranked below the worst mark of their criteria.
+    """
+    directions = np.array([
+        {Criteria.MAXIMUM: 1.0, Criteria.MINIMUM: -1.0}.get(criteria.optimal_type, 0.0)
+        for criteria in matrix.criterias
+    ])
+    values = matrix.values[:, directions != 0] * directions[directions != 0]
+    missing = np.isnan(values)
+    if missing.any():
+        worst = np.where(missing, np.inf, values).min(axis=0)
+        worst[np.isinf(worst)] = 0.0
+        values = np.where(missing, worst - 1.0, values)
+    return values
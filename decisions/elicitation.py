@@ -0,0 +1,98 @@
+import math
+
+
+class MergeSortElicitation(object):
+    """
+    Resumable merge sort of alternatives driven by an expert's answers.
+
+    Runs are lists of tie groups, best first. Runs are merged pairwise from a
+    queue, asking one comparison between the heads of the two runs at a time,
+    so sorting N alternatives takes about N log2 N answers. An '=' answer merges
+    both head groups into one. The whole state is a plain dict, so it can be
+    kept in the session between requests.
+    """
+
+    def __init__(self, state):
+        self.state = state
+
+    @classmethod
+    def start(cls, alternative_ids):
+        sorter = cls({
+            'pending': [[[pk]] for pk in alternative_ids],
+            'left': None,
+            'right': None,
+            'merged': None,
+            'answers': 0,
+            'size': len(alternative_ids),
+        })
+        sorter._advance()
+        return sorter
+
+    @property
+    def done(self):
+        return self.state['left'] is None
+
+    @property
+    def answers(self):
+        return self.state['answers']
+
+    @property
+    def expected_answers(self):
+        size = self.state['size']
+        return int(math.ceil(size * math.log(size, 2))) if size > 1 else 0
+
+    def next_pair(self):
+        if self.done:
+            return None
+        return self.state['left'][0][0], self.state['right'][0][0]
+
+    def answer(self, result):
+        """
+        Record the comparison of next_pair(): '>' if the first alternative is
+        better, '<' if it is worse and '=' if both are equal.
+        """
+        state = self.state
+        left, right, merged = state['left'], state['right'], state['merged']
+        if result == '>':
+            merged.append(left.pop(0))
+        elif result == '<':
+            merged.append(right.pop(0))
+        elif result == '=':
+            merged.append(left.pop(0) + right.pop(0))
+        else:
+            raise ValueError('Unknown comparison result %r' % result)
+        state['answers'] += 1
+        if not left or not right:
+            state['pending'].append(merged + left + right)
+            state['left'] = state['right'] = state['merged'] = None
+            self._advance()
+
+    def ranking(self):
+        """
+        Tie groups of alternative ids, best first, once the sort is done.
+        """
+        if not self.done:
+            return None
+        return self.state['pending'][0] if self.state['pending'] else []
+
+    def _advance(self):
+        pending = self.state['pending']
+        if self.done and len(pending) > 1:
+            self.state['left'] = pending.pop(0)
+            self.state['right'] = pending.pop(0)
+            self.state['merged'] = []
+
+
+def ranking_cells(groups):
+    """
+    Every ordered pair of distinct alternatives implied by tie groups, best first,
+    as {(first_id, second_id): result}.
+    """
+    position = {pk: index for index, group in enumerate(groups) for pk in group}
+    signs = {-1: '>', 0: '=', 1: '<'}
+    return {
+        (first, second): signs[(position[first] > position[second]) - (position[first] < position[second])]
+        for first in position
+        for second in position
+        if first != second
+    }
@@ -1,3 +1,5 @@
+from collections import OrderedDict, defaultdict
+
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.forms.formsets import BaseFormSet
@@ -5,6 +7,8 @@ from django.forms.widgets import PasswordInput, TextInput
 from django.utils.translation import ugettext_lazy as _
 
 from decisions.models import Criteria, Mark, Vector, Alternative, LPR, LPRCompare
+from decisions.sensitivity import DIRICHLET, UNIFORM
+from decisions.vectors import store_vectors
 
 
 class CustomAuthForm(AuthenticationForm):
@@ -28,6 +32,22 @@ class CustomAuthForm(AuthenticationForm):
     )
 
 
+def mark_choice_fields(criterias):
+    """
+    One required mark field per criteria, named after it, built from a single
+    Mark query. Cleaned values are the Mark instances.
+    """
+    marks = {}
+    choices = defaultdict(lambda: [('', '---------')])
+    for mark in Mark.objects.filter(criteria__in=criterias).select_related('criteria'):
+        marks[str(mark.id)] = mark
+        choices[mark.criteria_id].append((str(mark.id), str(mark)))
+    return OrderedDict(
+        ('%s' % criteria, forms.TypedChoiceField(choices=choices[criteria.id], coerce=marks.get))
+        for criteria in criterias
+    )
+
+
 class CreateVectorForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
@@ -41,20 +61,12 @@ class CreateVectorForm(forms.Form):
         """
         alternative = forms.ModelChoiceField(queryset=Alternative.objects.all())
         self.fields['alternative'] = alternative
-        criterias = Criteria.objects.all()
-        for criteria in criterias:
-            field_name = '%s' % criteria
-            self.fields[field_name] = forms.ModelChoiceField(queryset=Mark.objects.filter(criteria=criteria))
+        self.criterias = list(Criteria.objects.all())
+        self.fields.update(mark_choice_fields(self.criterias))
 
     def save(self):
-        alternative = Alternative.objects.get(name=self.cleaned_data['alternative'])
-        alternative.vector_set.all().delete()
-        criterias = Criteria.objects.all()
-        for criteria in criterias:
-            Vector.objects.create(
-                alternative=alternative,
-                mark=self.cleaned_data[criteria.name],
-            )
+        alternative = self.cleaned_data['alternative']
+        store_vectors(alternative, [self.cleaned_data[criteria.name] for criteria in self.criterias])
 
 
 class UpdateVectorForm(forms.ModelForm):
@@ -62,30 +74,22 @@ class UpdateVectorForm(forms.ModelForm):
 
     class Meta:
         model = Alternative
-        fields = '__all__'
+        fields = ('name',)
 
     def __init__(self, *args, **kwargs):
         super(UpdateVectorForm, self).__init__(*args, **kwargs)
-        criterias = Criteria.objects.all()
+        self.criterias = list(Criteria.objects.all())
         for field in self.disabled_fields:
             self.fields[field].disabled = True
-        for criteria in criterias:
-            field_name = '%s' % criteria
-            self.fields[field_name] = forms.ModelChoiceField(queryset=Mark.objects.filter(criteria=criteria))
-            print(Vector.objects.get(alternative=self.instance, mark__in=criteria.mark_set.all()).mark)
-            self.fields[field_name].initial = Vector.objects.get(alternative=self.instance,
-                                                                 mark__in=criteria.mark_set.all()).mark
+        self.fields.update(mark_choice_fields(self.criterias))
+        marks = dict(Vector.objects.filter(alternative=self.instance).values_list('mark__criteria_id', 'mark_id'))
+        for criteria in self.criterias:
+            self.fields['%s' % criteria].initial = marks.get(criteria.id)
 
     def save(self):
         alternative = self.instance
         alternative.name = self.cleaned_data['name']
-        alternative.vector_set.all().delete()
-        criterias = Criteria.objects.all()
-        for criteria in criterias:
-            Vector.objects.create(
-                alternative=alternative,
-                mark=self.cleaned_data[criteria.name],
-            )
+        store_vectors(alternative, [self.cleaned_data[criteria.name] for criteria in self.criterias])
 
 
 class LPRCriteriasForm(forms.ModelForm):
@@ -196,13 +200,35 @@ class AltCompareForm(forms.Form):
     )
 
     compare = forms.ChoiceField(choices=COMPARE_CHOICES)
+    first_id = forms.IntegerField(widget=forms.HiddenInput)
+    second_id = forms.IntegerField(widget=forms.HiddenInput)
 
     def __init__(self, *args, **kwargs):
+        self.vectors = kwargs.pop('vectors', None)
         super(AltCompareForm, self).__init__(*args, **kwargs)
 
         self.first_alternative = kwargs.get('initial', {}).get('first_alternative', None)
         self.second_alternative = kwargs.get('initial', {}).get('second_alternative', None)
 
-        if self.first_alternative:
-            self.first_vector = Alternative.objects.get(id=self.first_alternative.id).vector_set.all()
-            self.second_vector = Alternative.objects.get(id=self.second_alternative.id).vector_set.all()
+    @property
+    def first_vector(self):
+        return self.alternative_vectors(self.first_alternative)
+
+    @property
+    def second_vector(self):
+        return self.alternative_vectors(self.second_alternative)
+
+    def alternative_vectors(self, alternative):
+        """
+        Vectors of the alternative, taken from the {alternative_id: [vectors]} mapping
+        shared by the formset when there is one.
+        """
+        if self.vectors is None:
+            return alternative.vector_set.all()
+        return self.vectors.get(alternative.id, [])
+
+
+class RankStabilityForm(forms.Form):
+    samples = forms.IntegerField(min_value=1, max_value=100000)
+    method = forms.ChoiceField(choices=((DIRICHLET, 'Dirichlet'), (UNIFORM, '\u00b1 spread')))
+    spread = forms.FloatField(min_value=0, max_value=1, initial=0.2)
@@ -0,0 +1,81 @@
+import numpy as np
+from scipy import sparse
+
+from decisions.matrix import BETTER, EQUAL, WORSE
+from decisions.storage import read_pair_cells
+
+
+def preference_adjacency(size, rows, columns, codes):
+    """
+    Sparse N x N adjacency of the preference graph built from (row, column, code)
+    cells: an edge i -> j means alternative i is preferred or equal to j.
+    """
+    better = (codes == BETTER) | (codes == EQUAL)
+    worse = (codes == WORSE) | (codes == EQUAL)
+    sources = np.concatenate([rows[better], columns[worse]])
+    targets = np.concatenate([columns[better], rows[worse]])
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(sources), dtype=np.int8), (sources, targets)),
+        shape=(size, size)
+    )
+    adjacency.data[:] = 1
+    return adjacency
+
+
+def load_preference_graph(lpr, alternative_ids):
+    """
+    Preference graph of the LPR from a single query, nodes following the order
+    of alternative_ids.
+    """
+    return preference_adjacency(len(alternative_ids), *read_pair_cells(lpr, alternative_ids))
+
+
+def incidence_from_adjacency(adjacency):
+    """
+    N x E oriented incidence matrix of the graph without its self-loops:
+    +1 at the source and -1 at the target of every edge.
+    """
+    edges = sparse.coo_matrix(adjacency)
+    keep = edges.row != edges.col
+    sources, targets = edges.row[keep], edges.col[keep]
+    count = len(sources)
+    columns = np.arange(count)
+    return sparse.csr_matrix(
+        (np.concatenate([np.ones(count), -np.ones(count)]),
+         (np.concatenate([sources, targets]), np.concatenate([columns, columns]))),
+        shape=(adjacency.shape[0], count)
+    )
+
+
+def pareto_best_rows(incidence):
+    """
+    Rows of an incidence matrix without a negative entry, i.e. alternatives that
+    no other alternative is preferred to. Works on the sparse matrix directly,
+    so memory stays proportional to the number of edges.
+    """
+    incidence = sparse.csr_matrix(incidence)
+    negative = sparse.csr_matrix(incidence < 0)
+    return np.flatnonzero(np.diff(negative.indptr) == 0)
+
+
+def incidence_rows(incidence):
+    """
+    Dense rows of a sparse incidence matrix, one at a time, for display.
+    """
+    incidence = sparse.csr_matrix(incidence)
+    for row in range(incidence.shape[0]):
+        yield incidence.getrow(row).toarray().ravel()
+
+
+class IncidenceRows(object):
+    """
+    Keeps the sparse incidence matrix and streams its dense rows anew on every
+    iteration, so it can be cached and rendered more than once while only one
+    row is ever held densely.
+    """
+
+    def __init__(self, incidence):
+        self.incidence = sparse.csr_matrix(incidence)
+
+    def __iter__(self):
+        return incidence_rows(self.incidence)
@@ -0,0 +1,164 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from decisions.aggregation import DOMINANT_RESULTS, DOMINATED_RESULTS
+from decisions.graph import preference_adjacency
+from decisions.matrix import BETTER, EQUAL, UNKNOWN, WORSE, RESULT_CODES, RESULT_SIGNS, MIRRORED_CODES, \
+    canonical_pair, load_pair_cells, store_pair_results
+from decisions.models import Alternative, PairCompare
+
+
+def reachability(dag):
+    """
+    Boolean K x K matrix of the nodes reachable from every node of a DAG, the
+    node itself excluded. Nodes are peeled in topological levels and every node
+    ORs the packed reachability rows of its successors.
+    """
+    size = dag.shape[0]
+    dag = sparse.csr_matrix(dag)
+    indegree = np.diff(sparse.csc_matrix(dag).indptr).astype(np.int64)
+    levels = []
+    frontier = np.flatnonzero(indegree == 0)
+    while frontier.size:
+        levels.append(frontier)
+        indegree[frontier] = -1
+        indegree -= np.bincount(dag[frontier].indices, minlength=size)
+        frontier = np.flatnonzero(indegree == 0)
+
+    closed = np.zeros((size, (size + 7) // 8), dtype=np.uint8)
+    reached = np.zeros_like(closed)
+    for level in reversed(levels):
+        for node in level:
+            successors = dag.indices[dag.indptr[node]:dag.indptr[node + 1]]
+            if successors.size:
+                reached[node] = np.bitwise_or.reduce(closed[successors], axis=0)
+            closed[node] = reached[node]
+            closed[node, node >> 3] |= 0x80 >> (node & 7)
+    return np.unpackbits(reached, axis=1)[:, :size].astype(bool)
+
+
+def closure_codes(size, rows, columns, codes):
+    """
+    N x N result codes implied by the stated cells: alternatives in one strongly
+    connected component of the preference graph are equal, and an alternative
+    is better than every alternative reachable from its component.
+    """
+    adjacency = preference_adjacency(size, rows, columns, codes)
+    count, labels = connected_components(adjacency, directed=True, connection='strong')
+    edges = sparse.coo_matrix(adjacency)
+    between = labels[edges.row] != labels[edges.col]
+    dag = sparse.csr_matrix(
+        (np.ones(between.sum(), dtype=np.int8), (labels[edges.row[between]], labels[edges.col[between]])),
+        shape=(count, count)
+    )
+    reach = reachability(dag)
+
+    implied = np.full((size, size), UNKNOWN, dtype=np.int8)
+    better = reach[labels[:, None], labels[None, :]]
+    implied[better] = BETTER
+    implied[better.T] = WORSE
+    implied[labels[:, None] == labels[None, :]] = EQUAL
+    return implied
+
+
+@transaction.atomic
+def infer_closure(lpr):
+    """
+    Recompute every inferred comparison of the LPR from its stated ones.
+    Inferred rows that are no longer implied are deleted.
+    """
+    alternative_ids = list(Alternative.objects.order_by('id').values_list('id', flat=True))
+    size = len(alternative_ids)
+    rows, columns, codes = load_pair_cells(lpr, alternative_ids, inferred=False)
+    implied = closure_codes(size, rows, columns, codes)
+
+    stated = np.zeros((size, size), dtype=bool)
+    stated[rows, columns] = codes != UNKNOWN
+    keep = np.triu((implied != UNKNOWN) & ~stated, 1)
+
+    first, second = np.nonzero(keep)
+    ids = np.asarray(alternative_ids)
+    cells = dict(zip(zip(ids[first].tolist(), ids[second].tolist()), RESULT_SIGNS[implied[keep]].tolist()))
+    stale = [
+        pk for pk, first_id, second_id in PairCompare.objects.filter(lpr=lpr, inferred=True).values_list(
+            'id', 'first_alternative_id', 'second_alternative_id'
+        ) if (first_id, second_id) not in cells
+    ]
+    if stale:
+        PairCompare.objects.filter(id__in=stale).delete()
+    return store_pair_results(lpr, cells, inferred=True)
+
+
+def infer_after_answer(lpr, first_id, second_id, result):
+    """
+    Extend the inferred comparisons of the LPR after a stated first ? second answer.
+
+    Every alternative preferred or equal to the better one is preferred to every
+    alternative the worse one is preferred or equal to. Only those cells are
+    touched, so the cost depends on the neighbourhood of the answer rather than on
+    the whole matrix. An answer contradicting the stored comparisons closes a cycle,
+    and then the closure is recomputed from scratch.
+    """
+    if result == '<':
+        first_id, second_id, result = second_id, first_id, '>'
+    if result not in ('>', '=') or first_id == second_id:
+        return 0
+
+    def neighbours(pk, as_first, as_second):
+        """
+        {alternative_id: code} of the alternatives compared to pk with one of the
+        as_first results when pk is stored first, or as_second when it is stored
+        second. Codes are signed from the other alternative's point of view.
+        """
+        rows = PairCompare.objects.filter(
+            Q(first_alternative_id=pk, result__in=as_first) | Q(second_alternative_id=pk, result__in=as_second),
+            lpr=lpr
+        ).values_list('first_alternative_id', 'second_alternative_id', 'result')
+        found = {}
+        for first, second, value in rows:
+            if first == pk:
+                found[second] = MIRRORED_CODES[RESULT_CODES[value]]
+            else:
+                found[first] = RESULT_CODES[value]
+        found[pk] = EQUAL
+        return found
+
+    def above(pk):
+        return neighbours(pk, DOMINATED_RESULTS, DOMINANT_RESULTS)
+
+    def below(pk):
+        return neighbours(pk, DOMINANT_RESULTS, DOMINATED_RESULTS)
+
+    links = [(above(first_id), below(second_id))]
+    if result == '=':
+        links.append((above(second_id), below(first_id)))
+
+    cells = {}
+    for uppers, lowers in links:
+        for upper, upper_code in uppers.items():
+            for lower, lower_code in lowers.items():
+                if upper == lower:
+                    if result == '>':
+                        return infer_closure(lpr)
+                    continue
+                strict = result == '>' or upper_code == BETTER or lower_code == WORSE
+                first, second, sign = canonical_pair(upper, lower, '>' if strict else '=')
+                cells[(first, second)] = sign
+
+    ids = {pk for pair in cells for pk in pair}
+    stored = PairCompare.objects.filter(lpr=lpr, first_alternative_id__in=ids, second_alternative_id__in=ids)
+    for first, second, value in stored.values_list('first_alternative_id', 'second_alternative_id', 'result'):
+        first, second, value = canonical_pair(first, second, value)
+        expected = cells.get((first, second))
+        code = RESULT_CODES.get(value, UNKNOWN)
+        if expected is None or code == UNKNOWN:
+            continue
+        if code != RESULT_CODES[expected]:
+            return infer_closure(lpr)
+        del cells[(first, second)]
+    if not cells:
+        return 0
+    return store_pair_results(lpr, cells, inferred=True)
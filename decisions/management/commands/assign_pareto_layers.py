@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from decisions.pareto import assign_pareto_layers
+
+
+class Command(BaseCommand):
+    help = 'Store the Pareto layer of every alternative, computed from its criteria marks.'
+
+    def handle(self, *args, **options):
+        layers = assign_pareto_layers()
+        self.stdout.write('Pareto layers assigned: %d alternatives in %d layers.' % (
+            len(layers), max(layers.values(), default=0)
+        ))
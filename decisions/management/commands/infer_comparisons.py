@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from decisions.inference import infer_closure
+from decisions.models import LPR
+
+
+class Command(BaseCommand):
+    help = 'Recompute the comparisons every LPR implies transitively from its stated ones.'
+
+    def handle(self, *args, **options):
+        for lpr in LPR.objects.all():
+            written = infer_closure(lpr)
+            self.stdout.write('%s: %d inferred comparisons written.' % (lpr, written))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from decisions.normalization import normalize_marks
+
+
+class Command(BaseCommand):
+    help = 'Rescale the normalized marks of the given criterias, or of every criteria, after a bulk reload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('criteria_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        written = normalize_marks(options['criteria_ids'] or None)
+        self.stdout.write('Normalized marks written: %d.' % written)
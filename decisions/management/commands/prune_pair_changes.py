@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from decisions.changes import prune_pair_changes
+
+
+class Command(BaseCommand):
+    help = 'Delete the oldest comparison changes, keeping the newest ones in the change feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=settings.PAIR_CHANGES_KEPT,
+                            help='Number of newest changes to keep.')
+
+    def handle(self, *args, **options):
+        deleted = prune_pair_changes(options['keep'])
+        self.stdout.write('Comparison changes pruned: %d deleted.' % deleted)
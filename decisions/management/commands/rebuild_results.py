@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from decisions.aggregation import rebuild_results
+
+
+class Command(BaseCommand):
+    help = 'Recompute every Result weight, rank and alternative group weight from the stored comparisons.'
+
+    def handle(self, *args, **options):
+        created, corrected = rebuild_results()
+        self.stdout.write('Results rebuilt: %d created, %d corrected.' % (created, corrected))
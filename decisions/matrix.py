@@ -0,0 +1,174 @@
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.dispatch import Signal
+
+from decisions.aggregation import adjust_results, dominance
+from decisions.bulk import update_field
+from decisions.models import PairCompare
+
+UNKNOWN = 0
+BETTER = 1
+WORSE = 2
+EQUAL = 3
+
+RESULT_CODES = {
+    '>': BETTER,
+    '>=': BETTER,
+    '<': WORSE,
+    '=': EQUAL,
+}
+RESULT_SIGNS = np.array(['', '>', '<', '='])
+MIRRORED_RESULTS = {
+    '>': '<',
+    '>=': '<',
+    '<': '>',
+    '=': '=',
+}
+MIRRORED_CODES = np.array([UNKNOWN, WORSE, BETTER, EQUAL], dtype=np.int8)
+DOMINANT_CODES = (BETTER, EQUAL)
+
+# Sent after store_pair_results wrote {(first_id, second_id): result} in bulk,
+# bypassing the PairCompare model signals. results holds the written pairs only.
+pair_results_stored = Signal(providing_args=['lpr_id', 'results', 'inferred'])
+
+
+def canonical_pair(first_id, second_id, result):
+    """
+    Every unordered pair is stored once, smaller alternative id first, with the
+    result signed from the point of view of that first alternative.
+    """
+    if first_id > second_id:
+        return second_id, first_id, MIRRORED_RESULTS.get(result, result)
+    return first_id, second_id, result
+
+
+def index_pairs(alternative_ids, first_ids, second_ids):
+    """
+    Map alternative primary keys to matrix rows and columns.
+    Pairs referencing an alternative outside of alternative_ids are masked out.
+    """
+    ids = np.asarray(alternative_ids, dtype=np.int64)
+    order = np.argsort(ids)
+    sorted_ids = ids[order]
+
+    def lookup(keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = np.searchsorted(sorted_ids, keys).clip(0, max(len(ids) - 1, 0))
+        return order[positions], sorted_ids[positions] == keys
+
+    rows, rows_found = lookup(first_ids)
+    columns, columns_found = lookup(second_ids)
+    return rows, columns, rows_found & columns_found
+
+
+def load_pair_cells(lpr, alternative_ids, **filters):
+    """
+    Load every PairCompare of the LPR with a single query as (rows, columns, codes)
+    arrays, rows and columns following the order of alternative_ids. Each stored
+    row fills both of its cells, so canonical and mirrored rows read the same.
+    """
+    rows = list(PairCompare.objects.filter(lpr=lpr, **filters).values_list(
+        'first_alternative_id', 'second_alternative_id', 'result'
+    ))
+    if not rows or not len(alternative_ids):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.int8)
+
+    first_ids, second_ids, results = zip(*rows)
+    codes = np.fromiter((RESULT_CODES.get(result, UNKNOWN) for result in results), dtype=np.int8, count=len(rows))
+    row_index, column_index, found = index_pairs(alternative_ids, first_ids, second_ids)
+    row_index, column_index, codes = row_index[found], column_index[found], codes[found]
+    return (
+        np.concatenate([row_index, column_index]),
+        np.concatenate([column_index, row_index]),
+        np.concatenate([codes, MIRRORED_CODES[codes]]),
+    )
+
+
+def load_pair_matrix(lpr, alternative_ids, **filters):
+    """
+    Load every PairCompare of the LPR into a dense int8 N x N matrix. Unless the
+    rows are filtered, the diagonal is set to EQUAL: every alternative equals itself.
+    """
+    size = len(alternative_ids)
+    matrix = np.full((size, size), UNKNOWN, dtype=np.int8)
+    rows, columns, codes = load_pair_cells(lpr, alternative_ids, **filters)
+    matrix[rows, columns] = codes
+    if not filters:
+        matrix[np.diag_indices(size)] = EQUAL
+    return matrix
+
+
+def matrix_cells(matrix):
+    rows, columns = np.nonzero(matrix)
+    return rows, columns, matrix[rows, columns]
+
+
+def dominance_counts(matrix):
+    """
+    Number of alternatives each row alternative is better than or equal to.
+    """
+    return np.isin(matrix, DOMINANT_CODES).sum(axis=1)
+
+
+def best_rows(matrix):
+    counts = dominance_counts(matrix)
+    if not counts.size:
+        return counts
+    return np.flatnonzero(counts == counts.max())
+
+
+def matrix_signs(matrix):
+    return RESULT_SIGNS[matrix].tolist()
+
+
+@transaction.atomic
+def store_pair_results(lpr, cells, inferred=False):
+    """
+    Write {(first_id, second_id): result} comparisons of the LPR in bulk: one query
+    for the stored rows, one bulk insert and one UPDATE per changed column. Both
+    halves of a pair map to the same canonical row and the diagonal is skipped.
+    Bulk writes bypass the PairCompare signals, so the Result rows are adjusted here.
+    """
+    existing = {
+        (first, second): (pk, result, flag)
+        for pk, first, second, result, flag in PairCompare.objects.filter(lpr=lpr).values_list(
+            'id', 'first_alternative_id', 'second_alternative_id', 'result', 'inferred'
+        )
+    }
+    canonical = {}
+    for (first, second), result in cells.items():
+        if first != second:
+            first, second, result = canonical_pair(first, second, result)
+            canonical[(first, second)] = result
+
+    created = []
+    changed = {}
+    flagged = {}
+    written = {}
+    deltas = defaultdict(int)
+    for (first, second), result in canonical.items():
+        pk, previous, flag = existing.get((first, second), (None, None, inferred))
+        if pk is None:
+            created.append(PairCompare(lpr=lpr, first_alternative_id=first, second_alternative_id=second,
+                                       result=result, inferred=inferred))
+        else:
+            if previous != result:
+                changed[pk] = result
+            if flag != inferred:
+                flagged[pk] = inferred
+        if pk is None or previous != result or flag != inferred:
+            written[(first, second)] = result
+        gained, lost = dominance(result), dominance(previous)
+        deltas[first] += gained[0] - lost[0]
+        deltas[second] += gained[1] - lost[1]
+
+    PairCompare.objects.bulk_create(created)
+    update_field(PairCompare, 'result', changed)
+    update_field(PairCompare, 'inferred', flagged)
+    adjust_results(lpr.id, deltas)
+    if written:
+        pair_results_stored.send(sender=PairCompare, lpr_id=lpr.id, results=written, inferred=inferred)
+    return len(created) + len(changed)
@@ -0,0 +1,27 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alternative',
+            name='group_weight',
+            field=models.IntegerField(default=0, verbose_name='Group weight'),
+        ),
+        migrations.AlterField(
+            model_name='paircompare',
+            name='result',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='paircompare',
+            unique_together={('first_alternative', 'second_alternative', 'lpr')},
+        ),
+    ]
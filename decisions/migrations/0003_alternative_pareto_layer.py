@@ -0,0 +1,18 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0002_alternative_group_weight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alternative',
+            name='pareto_layer',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Pareto layer'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0003_alternative_pareto_layer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paircompare',
+            name='inferred',
+            field=models.BooleanField(default=False, verbose_name='Inferred'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, DenseRank
+
+from decisions.bulk import update_field
+
+MIRRORED_RESULTS = {'>': '<', '>=': '<', '<': '>', '=': '='}
+DOMINANT_RESULTS = ('>', '>=', '=')
+DOMINATED_RESULTS = ('<', '=')
+
+
+def store_each_pair_once(apps, schema_editor):
+    """
+    Keep one PairCompare row per unordered pair, smaller alternative id first,
+    drop the self comparisons and recount the Result weights, ranks and group
+    weights from the remaining rows.
+    """
+    PairCompare = apps.get_model('decisions', 'PairCompare')
+    Result = apps.get_model('decisions', 'Result')
+    Alternative = apps.get_model('decisions', 'Alternative')
+
+    rows = list(PairCompare.objects.values_list(
+        'id', 'lpr_id', 'first_alternative_id', 'second_alternative_id', 'result'
+    ))
+    canonical = {(lpr_id, first, second) for pk, lpr_id, first, second, result in rows if first < second}
+    redundant = []
+    for pk, lpr_id, first, second, result in rows:
+        if first == second or (first > second and (lpr_id, second, first) in canonical):
+            redundant.append(pk)
+        elif first > second:
+            PairCompare.objects.filter(id=pk).update(
+                first_alternative_id=second, second_alternative_id=first, result=MIRRORED_RESULTS.get(result, result)
+            )
+            canonical.add((lpr_id, second, first))
+    PairCompare.objects.filter(id__in=redundant).delete()
+
+    counts = defaultdict(int)
+    for field, results in (('first_alternative_id', DOMINANT_RESULTS), ('second_alternative_id', DOMINATED_RESULTS)):
+        for row in PairCompare.objects.order_by().values('lpr_id', field).annotate(
+                weight=Count('id', filter=Q(result__in=results))):
+            counts[(row['lpr_id'], row[field])] += row['weight']
+    update_field(Result, 'alternative_weight', {
+        pk: counts.get((lpr_id, alternative_id), 0)
+        for pk, lpr_id, alternative_id, weight in Result.objects.values_list(
+            'id', 'lpr_id', 'alternative_id', 'alternative_weight'
+        )
+        if weight != counts.get((lpr_id, alternative_id), 0)
+    })
+
+    ranked = Result.objects.annotate(position=Window(
+        expression=DenseRank(), partition_by=[F('lpr_id')], order_by=F('alternative_weight').desc()
+    )).values_list('id', 'rank', 'position')
+    update_field(Result, 'rank', {pk: position for pk, rank, position in ranked if rank != position})
+
+    totals = dict(Result.objects.order_by().values('alternative_id').annotate(
+        total=Sum(F('alternative_weight') * Coalesce(F('lpr__rank'), 0))
+    ).values_list('alternative_id', 'total'))
+    update_field(Alternative, 'group_weight', {
+        pk: totals.get(pk) or 0 for pk in Alternative.objects.values_list('id', flat=True)
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0004_paircompare_inferred'),
+    ]
+
+    operations = [
+        migrations.RunPython(store_each_pair_once, migrations.RunPython.noop),
+    ]
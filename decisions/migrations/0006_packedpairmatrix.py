@@ -0,0 +1,24 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0005_store_each_pair_once'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedPairMatrix',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alternative_ids', models.BinaryField(verbose_name='Alternative ids')),
+                ('cells', models.BinaryField(verbose_name='Cells')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+                ('lpr', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='packed_matrix', to='decisions.LPR', verbose_name='LPR')),
+            ],
+        ),
+    ]
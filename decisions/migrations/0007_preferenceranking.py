@@ -0,0 +1,22 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0006_packedpairmatrix'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreferenceRanking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('groups', models.TextField(verbose_name='Tie groups')),
+                ('lpr', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preference_ranking', to='decisions.LPR', verbose_name='LPR')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0007_preferenceranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lpr',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Data version'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.0.13 on 2026-10-18 15:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0008_lpr_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_alternative_id', models.IntegerField(verbose_name='First alternative id')),
+                ('second_alternative_id', models.IntegerField(verbose_name='Second alternative id')),
+                ('result', models.CharField(max_length=100, null=True)),
+                ('inferred', models.BooleanField(default=False, verbose_name='Inferred')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lpr',
+            name='changes_pruned_to',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Changes pruned up to'),
+        ),
+        migrations.AddField(
+            model_name='pairchange',
+            name='lpr',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='decisions.LPR', verbose_name='LPR'),
+        ),
+        migrations.AlterIndexTogether(
+            name='pairchange',
+            index_together={('lpr', 'id')},
+        ),
+    ]
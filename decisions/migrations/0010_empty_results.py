@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank
+
+from decisions.bulk import update_field
+
+
+def create_empty_results(apps, schema_editor):
+    """
+    Give every LPR and alternative pair without a Result row a weight 0 one and
+    rerank, so alternatives that dominate nobody are listed again.
+    """
+    Result = apps.get_model('decisions', 'Result')
+    LPR = apps.get_model('decisions', 'LPR')
+    Alternative = apps.get_model('decisions', 'Alternative')
+
+    existing = set(Result.objects.values_list('lpr_id', 'alternative_id'))
+    alternative_ids = list(Alternative.objects.values_list('id', flat=True))
+    Result.objects.bulk_create([
+        Result(lpr_id=lpr_id, alternative_id=alternative_id, alternative_weight=0)
+        for lpr_id in LPR.objects.values_list('id', flat=True)
+        for alternative_id in alternative_ids
+        if (lpr_id, alternative_id) not in existing
+    ])
+
+    ranked = Result.objects.annotate(position=Window(
+        expression=DenseRank(), partition_by=[F('lpr_id')], order_by=F('alternative_weight').desc()
+    )).values_list('id', 'rank', 'position')
+    update_field(Result, 'rank', {pk: position for pk, rank, position in ranked if rank != position})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0009_pair_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_empty_results, migrations.RunPython.noop),
+    ]
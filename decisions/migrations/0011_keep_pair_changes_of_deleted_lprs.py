@@ -0,0 +1,19 @@
+# Generated by Django 2.0.13 on 2026-10-18 16:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('decisions', '0010_empty_results'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pairchange',
+            name='lpr',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='decisions.LPR', verbose_name='LPR'),
+        ),
+    ]
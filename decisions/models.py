@@ -6,6 +6,15 @@ class Alternative(models.Model):
         max_length=255,
         verbose_name='Alternative name'
     )
+    group_weight = models.IntegerField(
+        verbose_name='Group weight',
+        default=0
+    )
+    pareto_layer = models.IntegerField(
+        verbose_name='Pareto layer',
+        null=True,
+        blank=True
+    )
 
     def __str__(self):
         return '%s' % self.name
@@ -26,6 +35,16 @@ class LPR(models.Model):
         through='Result',
         verbose_name="Results"
     )
+    data_version = models.PositiveIntegerField(
+        verbose_name='Data version',
+        default=0,
+        editable=False
+    )
+    changes_pruned_to = models.PositiveIntegerField(
+        verbose_name='Changes pruned up to',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = "LPR"
@@ -38,6 +57,16 @@ class LPR(models.Model):
     def __str__(self):
         return '%s' % self.name
 
+    def save(self, *args, **kwargs):
+        # data_version and changes_pruned_to are only moved in the database; a
+        # possibly stale instance never writes them back.
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('data_version', 'changes_pruned_to')
+            ]
+        super(LPR, self).save(*args, **kwargs)
+
 
 class Result(models.Model):
     lpr = models.ForeignKey(
@@ -212,14 +241,98 @@ class PairCompare(models.Model):
         max_length=100,
         null=True
     )
+    inferred = models.BooleanField(
+        verbose_name='Inferred',
+        default=False
+    )
 
     def __str__(self):
         return '%s: %s %s %s' % (self.lpr, self.first_alternative, self.result, self.second_alternative)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(PairCompare, cls).from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         unique_together = ('first_alternative', 'second_alternative', 'lpr')
 
 
+class PairChange(models.Model):
+    """
+    One write to a PairCompare cell, in the order of the increasing id; a None
+    result records a deleted comparison. The changes of a deleted LPR are left
+    behind, without a database constraint, for prune_pair_changes to drop, so
+    deleting an LPR does not delete its feed row by row.
+    """
+    lpr = models.ForeignKey(
+        LPR,
+        on_delete=models.DO_NOTHING,
+        verbose_name='LPR',
+        db_constraint=False
+    )
+    first_alternative_id = models.IntegerField(
+        verbose_name='First alternative id'
+    )
+    second_alternative_id = models.IntegerField(
+        verbose_name='Second alternative id'
+    )
+    result = models.CharField(
+        max_length=100,
+        null=True
+    )
+    inferred = models.BooleanField(
+        verbose_name='Inferred',
+        default=False
+    )
+
+    class Meta:
+        index_together = ('lpr', 'id')
+
+    def __str__(self):
+        return '%s #%s: %s %s %s' % (
+            self.lpr, self.id, self.first_alternative_id, self.result, self.second_alternative_id
+        )
+
+
+class PackedPairMatrix(models.Model):
+    lpr = models.OneToOneField(
+        LPR,
+        on_delete=models.CASCADE,
+        verbose_name='LPR',
+        related_name='packed_matrix'
+    )
+    alternative_ids = models.BinaryField(
+        verbose_name='Alternative ids'
+    )
+    cells = models.BinaryField(
+        verbose_name='Cells'
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Version',
+        default=0
+    )
+
+    def __str__(self):
+        return '%s (version %s)' % (self.lpr, self.version)
+
+
+class PreferenceRanking(models.Model):
+    lpr = models.OneToOneField(
+        LPR,
+        on_delete=models.CASCADE,
+        verbose_name='LPR',
+        related_name='preference_ranking'
+    )
+    groups = models.TextField(
+        verbose_name='Tie groups'
+    )
+
+    def __str__(self):
+        return '%s: %s' % (self.lpr, self.groups)
+
+
 class LPRCompare(models.Model):
     master_lpr = models.ForeignKey(
         LPR,
@@ -0,0 +1,56 @@
+from django.db import connection
+from django.dispatch import Signal
+
+from decisions.models import Criteria, Mark
+
+# Sent after normalize_marks rewrote marks with a raw UPDATE, bypassing the Mark
+# model signals. criteria_ids is None when every criteria was normalized.
+marks_normalized = Signal(providing_args=['criteria_ids'])
+
+NORMALIZE_MARKS_SQL = '''
+UPDATE {mark} SET normalized_mark = scaled.value
+FROM (
+    SELECT mark.id,
+        CASE criteria.optimal_type
+            WHEN %s THEN mark.numeric_value * 100
+                / NULLIF(MAX(mark.numeric_value) OVER (PARTITION BY mark.criteria_id), 0)
+            WHEN %s THEN MIN(mark.numeric_value) OVER (PARTITION BY mark.criteria_id) * 100
+                / NULLIF(mark.numeric_value, 0)
+        END AS value
+    FROM {mark} AS mark
+    JOIN {criteria} AS criteria ON criteria.id = mark.criteria_id
+    WHERE criteria.optimal_type IN (%s, %s) {criteria_filter}
+) AS scaled
+WHERE {mark}.id = scaled.id AND {mark}.normalized_mark IS DISTINCT FROM scaled.value
+'''
+
+
+def normalize_marks(criteria_ids=None):
+    """
+    Rescale the marks of the given criterias, or of every criteria, to 0-100 with
+    one UPDATE: numeric_value * 100 / max for a maximized criteria and
+    min * 100 / numeric_value for a minimized one, MIN and MAX being window
+    aggregates partitioned by criteria. Only marks whose normalized value changes
+    are written, so renormalizing a criteria whose bounds did not move touches at
+    most the edited mark. Returns the number of marks written.
+    """
+    if criteria_ids is not None:
+        criteria_ids = list(criteria_ids)
+        if not criteria_ids:
+            return 0
+    criteria_filter = ''
+    params = [Criteria.MAXIMUM, Criteria.MINIMUM, Criteria.MAXIMUM, Criteria.MINIMUM]
+    if criteria_ids is not None:
+        criteria_filter = 'AND mark.criteria_id IN (%s)' % ', '.join(['%s'] * len(criteria_ids))
+        params.extend(criteria_ids)
+    sql = NORMALIZE_MARKS_SQL.format(
+        mark=connection.ops.quote_name(Mark._meta.db_table),
+        criteria=connection.ops.quote_name(Criteria._meta.db_table),
+        criteria_filter=criteria_filter
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        written = cursor.rowcount
+    if written:
+        marks_normalized.send(sender=Mark, criteria_ids=criteria_ids)
+    return written
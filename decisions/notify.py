@@ -0,0 +1,94 @@
+import json
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.db import connection, connections
+
+from decisions.cache import result_cache
+from decisions.smart import forget_decision_matrix
+
+logger = logging.getLogger(__name__)
+
+# Cached views computed from the marks of the alternatives.
+MARK_VIEWS = ('compare-alternatives',)
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def notify_change(criteria_id=None):
+    """
+    Tell every worker that the marks of a criteria, or the alternatives, criterias
+    and marks at large when none is given, changed. Their in-memory decision
+    matrix is not keyed by any version. PostgreSQL delivers the NOTIFY when the
+    transaction commits and folds identical ones sent within it.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    payload = {} if criteria_id is None else {'criteria': criteria_id}
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [settings.CACHE_NOTIFY_CHANNEL, json.dumps(payload)])
+
+
+def evict(payload):
+    """
+    Drop the cached values affected by a notification. A criteria or mark
+    change drops the decision matrix and the pages built from marks; any other
+    change, or a notification that may have been missed, drops everything.
+    Result pages of a changed LPR need no notification: they are keyed by its
+    data version, so they are never read again and age out.
+    """
+    forget_decision_matrix()
+    if payload.get('criteria') is not None:
+        result_cache.discard(lambda key: key[0] in MARK_VIEWS)
+    else:
+        result_cache.clear()
+
+
+def listen(timeout=5.0, retry=5.0, stop=None):
+    """
+    Evict cached values as notifications arrive, over a connection of its own
+    in autocommit mode. After the connection is lost notifications may have
+    been missed, so everything is evicted before listening again.
+    """
+    import psycopg2
+    import psycopg2.extensions
+
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            listener = psycopg2.connect(**connections['default'].get_connection_params())
+            try:
+                listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with listener.cursor() as cursor:
+                    cursor.execute('LISTEN %s' % settings.CACHE_NOTIFY_CHANNEL)
+                evict({})
+                while not stop.is_set():
+                    if select.select([listener], [], [], timeout) == ([], [], []):
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        notification = listener.notifies.pop(0)
+                        evict(json.loads(notification.payload or '{}'))
+            finally:
+                listener.close()
+        except Exception:
+            logger.exception('Cache notification listener failed, reconnecting in %s seconds', retry)
+            stop.wait(retry)
+
+
+def start_listener():
+    """
+    Start the listener thread of this worker process once, when the database is
+    PostgreSQL and CACHE_NOTIFY_LISTENER is enabled.
+    """
+    global _listener
+    if not settings.CACHE_NOTIFY_LISTENER or connection.vendor != 'postgresql':
+        return None
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=listen, name='decisions-cache-listener', daemon=True)
+            _listener.start()
+    return _listener
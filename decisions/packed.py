@@ -0,0 +1,104 @@
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F
+
+from decisions.models import PackedPairMatrix
+
+CELLS_PER_BYTE = 4
+CELL_MASK = 0b11
+SHIFTS = np.arange(0, 8, 2, dtype=np.uint8)
+IN_PLACE_MAX_CELLS = 8
+
+
+def pack_codes(matrix):
+    """
+    Pack an N x N matrix of 2-bit result codes row-major, four cells per byte,
+    the first cell in the lowest bits.
+    """
+    codes = np.ascontiguousarray(matrix, dtype=np.uint8).ravel()
+    padded = np.zeros(-(-codes.size // CELLS_PER_BYTE) * CELLS_PER_BYTE, dtype=np.uint8)
+    padded[:codes.size] = codes
+    return np.bitwise_or.reduce(padded.reshape(-1, CELLS_PER_BYTE) << SHIFTS, axis=1).astype(np.uint8).tobytes()
+
+
+def unpack_codes(buffer, size):
+    """
+    N x N int8 result codes of a packed buffer. The buffer is read through
+    numpy.frombuffer, so the stored bytes are not copied before unpacking.
+    """
+    packed = np.frombuffer(buffer, dtype=np.uint8)
+    codes = (packed[:, None] >> SHIFTS) & CELL_MASK
+    return codes.ravel()[:size * size].astype(np.int8).reshape(size, size)
+
+
+def packed_ids(buffer):
+    return np.frombuffer(buffer, dtype='<i8')
+
+
+def cell_position(size, row, column):
+    """
+    Byte offset and bit shift of a cell in the packed buffer.
+    """
+    index = row * size + column
+    return index // CELLS_PER_BYTE, 2 * (index % CELLS_PER_BYTE)
+
+
+def load_packed_matrix(lpr, alternative_ids):
+    """
+    The stored packed matrix of the LPR as N x N codes, or None when there is
+    none or it was built for other alternatives.
+    """
+    stored = PackedPairMatrix.objects.filter(lpr=lpr).values_list('alternative_ids', 'cells').first()
+    if stored is None or not np.array_equal(packed_ids(stored[0]), np.asarray(alternative_ids, dtype=np.int64)):
+        return None
+    return unpack_codes(stored[1], len(alternative_ids))
+
+
+def store_packed_matrix(lpr_id, alternative_ids, matrix):
+    """
+    Replace the packed matrix of the LPR and bump its version. Callers hold the
+    LPR row lock, so two first stores never race on the one-to-one insert.
+    """
+    values = {
+        'alternative_ids': np.asarray(alternative_ids, dtype='<i8').tobytes(),
+        'cells': pack_codes(matrix),
+    }
+    if not PackedPairMatrix.objects.filter(lpr_id=lpr_id).update(version=F('version') + 1, **values):
+        PackedPairMatrix.objects.create(lpr_id=lpr_id, version=1, **values)
+
+
+@transaction.atomic
+def update_packed_cells(lpr_id, cells):
+    """
+    Write {(first_id, second_id): code} into the stored packed matrix of the LPR.
+    A few cells are patched byte by byte in the database on PostgreSQL, other
+    edits rewrite the buffer once. A matrix that does not cover one of the
+    alternatives is dropped, to be rebuilt from the rows on the next read.
+    """
+    stored = PackedPairMatrix.objects.select_for_update().filter(lpr_id=lpr_id).first()
+    if stored is None or not cells:
+        return
+    positions = {pk: index for index, pk in enumerate(packed_ids(stored.alternative_ids).tolist())}
+    if any(first not in positions or second not in positions for first, second in cells):
+        stored.delete()
+        return
+
+    size = len(positions)
+    edits = [(positions[first], positions[second], code) for (first, second), code in cells.items()]
+    if connection.vendor == 'postgresql' and len(edits) <= IN_PLACE_MAX_CELLS:
+        table = connection.ops.quote_name(PackedPairMatrix._meta.db_table)
+        with connection.cursor() as cursor:
+            for row, column, code in edits:
+                offset, shift = cell_position(size, row, column)
+                cursor.execute(
+                    'UPDATE %s SET cells = set_byte(cells, %%s, (get_byte(cells, %%s) & %%s) | %%s) '
+                    'WHERE id = %%s' % table,
+                    [offset, offset, 0xFF ^ (CELL_MASK << shift), int(code) << shift, stored.id]
+                )
+        PackedPairMatrix.objects.filter(id=stored.id).update(version=F('version') + 1)
+        return
+
+    matrix = unpack_codes(stored.cells, size)
+    rows, columns, codes = zip(*edits)
+    matrix[list(rows), list(columns)] = codes
+    PackedPairMatrix.objects.filter(id=stored.id).update(cells=pack_codes(matrix), version=F('version') + 1)
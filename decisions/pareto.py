@@ -0,0 +1,128 @@
+import numpy as np
+
+from decisions.bulk import update_field
+from decisions.criteria_matrix import load_criteria_matrix, oriented_values
+from decisions.models import Alternative
+from decisions.smart import decision_matrix_generation
+
+PARETO_BLOCK_SIZE = 1024
+DOMINANCE_BLOCK_SIZE = 128
+
+_pareto_front = None
+
+
+def dominated_by(candidates, points, block_size=DOMINANCE_BLOCK_SIZE):
+    """
+    Mask of the candidates dominated by at least one of the points, higher being
+    better on every column. Points are compared in blocks to bound memory, and
+    candidates leave the comparison as soon as one block dominates them.
+    """
+    dominated = np.zeros(len(candidates), dtype=bool)
+    alive = np.arange(len(candidates))
+    for start in range(0, len(points), block_size):
+        if not alive.size:
+            break
+        block = points[start:start + block_size, None, :]
+        remaining = candidates[None, alive, :]
+        hit = ((block >= remaining).all(axis=2) & (block > remaining).any(axis=2)).any(axis=0)
+        dominated[alive[hit]] = True
+        alive = alive[~hit]
+    return dominated
+
+
+def pareto_front(values, block_size=PARETO_BLOCK_SIZE):
+    """
+    Row indexes of the non-dominated rows of values, higher being better on every column.
+
+    Sort-filter-skyline: rows are visited by decreasing sum, so a row can only be
+    dominated by rows visited before it. Every block of rows is checked against
+    the front found so far and against itself, and its survivors join the front.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-values.sum(axis=1), kind='stable')
+    front = []
+    front_values = values[:0]
+    for start in range(0, len(order), block_size):
+        block = order[start:start + block_size]
+        block = block[~dominated_by(values[block], front_values)]
+        block = block[~dominated_by(values[block], values[block])]
+        front.extend(block.tolist())
+        front_values = values[front]
+    return np.sort(np.array(front, dtype=np.int64))
+
+
+def domination_counts(values, sources, targets, block_size=DOMINANCE_BLOCK_SIZE):
+    """
+    For every target row, the number of source rows dominating it. Sources are
+    compared in blocks so memory stays bounded by block_size x len(targets).
+    """
+    counts = np.zeros(len(targets), dtype=np.int64)
+    target_values = values[None, targets, :]
+    for start in range(0, len(sources), block_size):
+        block = values[sources[start:start + block_size], None, :]
+        dominates = (block >= target_values).all(axis=2) & (block > target_values).any(axis=2)
+        counts += dominates.sum(axis=0)
+    return counts
+
+
+def non_dominated_sort(values, block_size=DOMINANCE_BLOCK_SIZE):
+    """
+    Pareto layer of every row, 1 being the non-dominated front.
+
+    Every row starts with the number of rows dominating it. Rows with no
+    dominator left form the next layer, and their dominance is then subtracted
+    from the rows that remain.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    remaining = np.arange(len(values))
+    layers = np.zeros(len(values), dtype=np.int64)
+    counts = domination_counts(values, remaining, remaining, block_size)
+    layer = 0
+    while remaining.size:
+        layer += 1
+        front = counts == 0
+        layers[remaining[front]] = layer
+        sources = remaining[front]
+        remaining, counts = remaining[~front], counts[~front]
+        counts -= domination_counts(values, sources, remaining, block_size)
+    return layers
+
+
+def assign_pareto_layers():
+    """
+    Store the Pareto layer of every alternative on the criteria with an optimal type.
+    """
+    matrix = load_criteria_matrix()
+    layers = dict(zip(matrix.alternative_ids, non_dominated_sort(oriented_values(matrix)).tolist()))
+    update_field(Alternative, 'pareto_layer', {
+        pk: layers[pk]
+        for pk, layer in Alternative.objects.values_list('id', 'pareto_layer')
+        if pk in layers and layer != layers[pk]
+    })
+    return layers
+
+
+def pareto_front_ids():
+    """
+    Ids of the alternatives on the Pareto front, computed once per generation of
+    the decision matrix: the marks, criterias and alternatives it depends on
+    move the generation forward when they change, here and in the other workers.
+    """
+    global _pareto_front
+    generation = decision_matrix_generation()
+    cached = _pareto_front
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    matrix = load_criteria_matrix()
+    ids = [matrix.alternative_ids[row] for row in pareto_front(oriented_values(matrix))]
+    # Computed from data older than the generation read first, so a change made
+    # meanwhile leaves it behind.
+    _pareto_front = (generation, ids)
+    return ids
+
+
+def pareto_front_alternatives():
+    """
+    Alternatives not dominated by any other one on the criteria with an optimal type.
+    """
+    return list(Alternative.objects.filter(id__in=pareto_front_ids()))
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+
+from decisions.matrix import BETTER, EQUAL, UNKNOWN, WORSE
+from decisions.models import PreferenceRanking
+
+
+def codes_from_positions(positions):
+    """
+    N x N result codes of alternatives at the given tie group positions, 0 best.
+    """
+    positions = np.asarray(positions)
+    rows, columns = positions[:, None], positions[None, :]
+    return np.select([rows < columns, rows > columns], [BETTER, WORSE], EQUAL).astype(np.int8)
+
+
+def weak_order_groups(alternative_ids, matrix):
+    """
+    Tie groups of alternative ids, best first, when the N x N codes compare every
+    pair as a complete weak order, otherwise None.
+
+    In a weak order an alternative is better than exactly the alternatives of the
+    lower groups, so the groups follow from the number of alternatives every row
+    beats. The matrix is a weak order iff it equals the one those groups imply,
+    which rejects missing, contradicting and cyclic comparisons alike.
+    """
+    if not len(alternative_ids):
+        return []
+    beaten = (matrix == BETTER).sum(axis=1)
+    levels, positions = np.unique(-beaten, return_inverse=True)
+    if not np.array_equal(matrix, codes_from_positions(positions)):
+        return None
+    groups = [[] for level in levels]
+    for pk, position in zip(alternative_ids, positions.tolist()):
+        groups[position].append(pk)
+    return groups
+
+
+class PreferenceOrder(object):
+    """
+    Preference of an LPR stored as tie groups of alternative ids, best first,
+    with a position index answering any pair in O(1).
+    """
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.positions = {pk: index for index, group in enumerate(groups) for pk in group}
+
+    def covers(self, alternative_ids):
+        return len(alternative_ids) == len(self.positions) and all(pk in self.positions for pk in alternative_ids)
+
+    def code(self, first_id, second_id):
+        first, second = self.positions.get(first_id), self.positions.get(second_id)
+        if first is None or second is None:
+            return UNKNOWN
+        return BETTER if first < second else WORSE if first > second else EQUAL
+
+    def matrix(self, alternative_ids):
+        return codes_from_positions([self.positions[pk] for pk in alternative_ids])
+
+
+def load_preference_order(lpr):
+    groups = PreferenceRanking.objects.filter(lpr=lpr).values_list('groups', flat=True).first()
+    return None if groups is None else PreferenceOrder(json.loads(groups))
+
+
+def store_preference_order(lpr_id, groups):
+    PreferenceRanking.objects.update_or_create(lpr_id=lpr_id, defaults={'groups': json.dumps(groups)})
+
+
+def forget_preference_order(lpr_id):
+    PreferenceRanking.objects.filter(lpr_id=lpr_id).delete()
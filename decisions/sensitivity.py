@@ -0,0 +1,118 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from decisions.smart import current_weights, decision_matrix, normalized_weights, weighted_scores
+
+RankStability = namedtuple('RankStability', ['alternative_ids', 'rank_counts', 'samples'])
+
+DIRICHLET = 'dirichlet'
+UNIFORM = 'uniform'
+
+
+def sample_weights(weights, samples, method=DIRICHLET, spread=0.2, concentration=100.0, random_state=None):
+    """
+    samples x criteria weight vectors around weights, each summing to 1.
+
+    dirichlet draws from a Dirichlet distribution centred on the normalized
+    weights; the larger the concentration, the closer the samples stay to them.
+    uniform scales every weight independently by a factor in [1 - spread, 1 + spread].
+    """
+    random_state = np.random.RandomState(random_state)
+    weights = normalized_weights(weights)
+    if method == DIRICHLET:
+        # Criteria with no weight stay at 0 instead of breaking the distribution.
+        alpha = weights * concentration
+        sampled = np.zeros((samples, len(weights)))
+        sampled[:, alpha > 0] = random_state.dirichlet(alpha[alpha > 0], samples)
+        return sampled
+    if method == UNIFORM:
+        factors = random_state.uniform(1 - spread, 1 + spread, (samples, len(weights)))
+        return normalized_weights((weights * factors).T).T
+    raise ValueError('Unknown sampling method %r' % method)
+
+
+def count_ranks(values, weights):
+    """
+    N x N matrix counting how often each alternative row took each rank, 0 being
+    the best, over the scenarios x criteria weights. Ties keep the row order.
+    """
+    size = len(values)
+    order = np.argsort(-weighted_scores(values, weights.T), axis=0, kind='stable')
+    ranks = np.broadcast_to(np.arange(size)[:, None], order.shape)
+    return np.bincount((order * size + ranks).ravel(), minlength=size * size).reshape(size, size)
+
+
+def count_sampled_ranks(values, weights, samples, method, spread, concentration, random_state, batch):
+    """
+    count_ranks over samples weight vectors drawn batch by batch, so memory is
+    bounded by batch x N utilities. Runs in the pool workers, so it only gets
+    plain arrays and numbers.
+    """
+    random_state = np.random.RandomState(random_state)
+    counts = np.zeros((len(values), len(values)), dtype=np.int64)
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        sampled = sample_weights(weights, size, method, spread, concentration, random_state.randint(2 ** 31))
+        counts += count_ranks(values, sampled)
+    return counts
+
+
+def rank_stability(samples=None, method=DIRICHLET, spread=0.2, concentration=100.0, workers=None,
+                   random_state=None, matrix=None):
+    """
+    Monte Carlo rank distribution of the SMART ranking under weight uncertainty:
+    samples weight vectors around the stored Criteria.weight values are scored in
+    batches of matrix-matrix products. With more than one worker, the samples
+    are split across a process pool, each worker counting its own share.
+    """
+    if matrix is None:
+        matrix = decision_matrix()
+    if samples is None:
+        samples = settings.RANK_STABILITY_SAMPLES
+    if workers is None:
+        workers = settings.RANK_STABILITY_WORKERS
+    weights = current_weights(matrix.criterias)
+    ids = np.asarray(matrix.alternative_ids, dtype=np.int64)
+    if not len(ids) or not samples or not sum(weights):
+        return RankStability(ids, np.zeros((len(ids), len(ids)), dtype=np.int64), 0)
+
+    batch = max(1, settings.SMART_CHUNK_SIZE // len(ids))
+    seeds = np.random.RandomState(random_state).randint(2 ** 31, size=max(workers, 1))
+    jobs = [
+        (samples // len(seeds) + (index < samples % len(seeds)), seed) for index, seed in enumerate(seeds)
+    ]
+    if len(jobs) == 1:
+        counts = count_sampled_ranks(matrix.values, weights, samples, method, spread, concentration, seeds[0], batch)
+    else:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = [
+                pool.submit(count_sampled_ranks, matrix.values, weights, share, method, spread, concentration,
+                            seed, batch)
+                for share, seed in jobs if share
+            ]
+            counts = sum(future.result() for future in futures)
+    return RankStability(ids, counts, samples)
+
+
+def stability_report(stability):
+    """
+    [(alternative_id, probability of being best, mean rank, (5th, 95th) percentile
+    rank)] by decreasing probability of being best, ranks counted from 1.
+    """
+    if not stability.samples:
+        return []
+    counts = stability.rank_counts
+    positions = np.arange(1, counts.shape[1] + 1)
+    best = counts[:, 0] / stability.samples
+    mean = counts.dot(positions) / stability.samples
+    cumulative = counts.cumsum(axis=1)
+    low = (cumulative < 0.05 * stability.samples).sum(axis=1) + 1
+    high = (cumulative < 0.95 * stability.samples).sum(axis=1) + 1
+    order = np.lexsort((mean, -best))
+    return [
+        (int(stability.alternative_ids[row]), float(best[row]), float(mean[row]), (int(low[row]), int(high[row])))
+        for row in order
+    ]
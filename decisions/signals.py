@@ -0,0 +1,205 @@
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from decisions.aggregation import adjust_results, create_empty_results, dominance, refresh_group_weights
+from decisions.cache import bump_data_version
+from decisions.changes import record_pair_changes
+from decisions.inference import infer_after_answer, infer_closure
+from decisions.matrix import pair_results_stored
+from decisions.models import LPR, Alternative, Criteria, Mark, PairCompare, Result, Vector
+from decisions.normalization import marks_normalized
+from decisions.notify import notify_change
+from decisions.smart import forget_decision_matrix
+from decisions.storage import pair_results_changed, refresh_derived_matrix
+from decisions.vectors import vectors_stored
+
+_deleting = threading.local()
+
+
+def deleting(model):
+    """
+    {id: data} of the model's instances whose delete is cascading in this thread.
+    Rows deleted along with them are accounted for once by the parent's receiver.
+    """
+    if not hasattr(_deleting, 'instances'):
+        _deleting.instances = defaultdict(dict)
+    return _deleting.instances[model]
+
+
+def parent_deleted(lpr_id=None, *alternative_ids):
+    return lpr_id in deleting(LPR) or any(pk in deleting(Alternative) for pk in alternative_ids)
+
+
+def pair_state(instance):
+    return {
+        'lpr_id': instance.lpr_id,
+        'first_alternative_id': instance.first_alternative_id,
+        'second_alternative_id': instance.second_alternative_id,
+        'result': instance.result,
+        'inferred': instance.inferred,
+    }
+
+
+def pair_key(instance):
+    return instance.first_alternative_id, instance.second_alternative_id
+
+
+def lpr_data_changed(lpr_id):
+    """
+    Move the LPR's data version forward. Every cached page of the LPR, in any
+    worker, is keyed by it, so no notification is needed to evict them.
+    """
+    bump_data_version(lpr_id)
+
+
+def infer_from_answer(instance, previous):
+    """
+    Extend the LPR's inferred comparisons after a stated answer. A stated answer
+    that changed invalidates earlier inferences, so the closure is rebuilt.
+    """
+    stated = previous and not previous.get('inferred') and previous.get('result') is not None
+    if instance.inferred or (stated and previous['result'] == instance.result):
+        return
+    if stated:
+        infer_closure(instance.lpr)
+    else:
+        infer_after_answer(instance.lpr, instance.first_alternative_id, instance.second_alternative_id,
+                           instance.result)
+
+
+def apply_dominance_changes(changes):
+    """
+    Apply [(state, delta)] PairCompare changes to the stored results.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, delta in changes:
+        if state and state['first_alternative_id'] != state['second_alternative_id']:
+            first, second = dominance(state.get('result'))
+            deltas[state['lpr_id']][state['first_alternative_id']] += first * delta
+            deltas[state['lpr_id']][state['second_alternative_id']] += second * delta
+    for lpr_id, lpr_deltas in deltas.items():
+        adjust_results(lpr_id, lpr_deltas)
+
+
+@receiver(post_save, sender=PairCompare)
+def pair_compare_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_values', None)
+    current = pair_state(instance)
+    instance._loaded_values = current
+    apply_dominance_changes([(previous, -1), (current, 1)])
+    record_pair_changes(instance.lpr_id, {pair_key(instance): instance.result}, instance.inferred)
+    lpr_data_changed(instance.lpr_id)
+    pair_results_changed(instance.lpr_id, {pair_key(instance): instance.result})
+    infer_from_answer(instance, previous)
+
+
+@receiver(post_delete, sender=PairCompare)
+def pair_compare_deleted(sender, instance, **kwargs):
+    if parent_deleted(instance.lpr_id, instance.first_alternative_id, instance.second_alternative_id):
+        return
+    previous = getattr(instance, '_loaded_values', None) or pair_state(instance)
+    apply_dominance_changes([(previous, -1)])
+    record_pair_changes(instance.lpr_id, {pair_key(instance): None})
+    lpr_data_changed(instance.lpr_id)
+    pair_results_changed(instance.lpr_id, {pair_key(instance): None})
+
+
+@receiver(pair_results_stored)
+def pair_results_saved(sender, lpr_id, results, inferred=False, **kwargs):
+    record_pair_changes(lpr_id, results, inferred)
+    lpr_data_changed(lpr_id)
+    refresh_derived_matrix(lpr_id)
+
+
+@receiver(pre_delete, sender=LPR)
+def lpr_deleting(sender, instance, **kwargs):
+    deleting(LPR)[instance.id] = None
+
+
+@receiver(post_save, sender=LPR)
+@receiver(post_delete, sender=LPR)
+def lpr_changed(sender, instance, raw=False, created=False, **kwargs):
+    if not raw:
+        if created:
+            create_empty_results(lpr_ids=[instance.id])
+        deleting(LPR).pop(instance.id, None)
+        refresh_group_weights()
+
+
+@receiver(pre_delete, sender=Alternative)
+def alternative_deleting(sender, instance, **kwargs):
+    deleting(Alternative)[instance.id] = list(PairCompare.objects.filter(
+        Q(first_alternative_id=instance.id) | Q(second_alternative_id=instance.id)
+    ).values('lpr_id', 'first_alternative_id', 'second_alternative_id', 'result', 'inferred'))
+
+
+@receiver(post_delete, sender=Alternative)
+def alternative_deleted(sender, instance, **kwargs):
+    """
+    Account for the comparisons deleted with the alternative in bulk, per LPR:
+    one dominance adjustment, one change feed insert and one version bump.
+    """
+    states = deleting(Alternative).pop(instance.id, None) or []
+    # A comparison between two deleted alternatives is left to the last of them.
+    states = [
+        state for state in states
+        if not parent_deleted(state['lpr_id'], state['first_alternative_id'], state['second_alternative_id'])
+    ]
+    apply_dominance_changes([(state, -1) for state in states])
+    deleted = defaultdict(dict)
+    for state in states:
+        deleted[state['lpr_id']][(state['first_alternative_id'], state['second_alternative_id'])] = None
+    for lpr_id, results in deleted.items():
+        record_pair_changes(lpr_id, results)
+        pair_results_changed(lpr_id, results)
+
+
+@receiver(post_save, sender=Alternative)
+def alternative_created(sender, instance, raw=False, created=False, **kwargs):
+    if created and not raw:
+        create_empty_results(alternative_ids=[instance.id])
+
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def result_changed(sender, instance, raw=False, **kwargs):
+    if not raw and not parent_deleted(instance.lpr_id, instance.alternative_id):
+        lpr_data_changed(instance.lpr_id)
+
+
+@receiver(post_save, sender=Alternative)
+@receiver(post_delete, sender=Alternative)
+@receiver(post_save, sender=Criteria)
+@receiver(post_delete, sender=Criteria)
+@receiver(post_save, sender=Mark)
+@receiver(post_delete, sender=Mark)
+@receiver(post_save, sender=Vector)
+@receiver(post_delete, sender=Vector)
+@receiver(marks_normalized)
+@receiver(vectors_stored)
+def decision_matrix_changed(sender, instance=None, raw=False, **kwargs):
+    """
+    Drop the cached decision matrix now and again once the transaction commits,
+    so a matrix reloaded in between from the old rows is not kept. Every LPR
+    shows the alternatives and their marks, so all their data versions move and
+    the other workers are told to evict theirs.
+    """
+    if isinstance(instance, Vector) and parent_deleted(None, instance.alternative_id):
+        return
+    if not raw:
+        forget_decision_matrix()
+        transaction.on_commit(forget_decision_matrix)
+        bump_data_version()
+        if isinstance(instance, Mark):
+            notify_change(criteria_id=instance.criteria_id)
+        elif isinstance(instance, Criteria):
+            notify_change(criteria_id=instance.id)
+        else:
+            notify_change()
@@ -0,0 +1,151 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+from decisions.criteria_matrix import load_criteria_matrix
+from decisions.models import Alternative, Criteria
+
+ScoredAlternatives = namedtuple('ScoredAlternatives', ['alternative_ids', 'scores'])
+
+_decision_matrix = None
+_decision_matrix_generation = 0
+_decision_matrix_lock = threading.Lock()
+
+
+def normalized_weights(weights):
+    """
+    Criteria weights scaled to sum 1 along the first axis, so utilities stay on
+    the 0-100 scale of the normalized marks. One column per weight vector.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    totals = weights.sum(axis=0)
+    return weights / np.where(totals > 0, totals, 1)
+
+
+def weighted_scores(values, weights):
+    """
+    SMART utility of every alternative row: the weighted sum of its normalized
+    marks. weights is a criteria vector or a criteria x scenario matrix, giving
+    one utility per alternative or one column of utilities per scenario.
+    """
+    return np.nan_to_num(values).dot(normalized_weights(weights))
+
+
+def top_rows(scores, k=None):
+    """
+    Rows of the k best scores, best first; every row when k is None.
+    argpartition selects the k best before only those are sorted.
+    """
+    scores = np.asarray(scores)
+    if k is not None and k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k] if k > 0 else np.array([], dtype=np.int64)
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def score_blocks(criterias=None, weights=None, chunk_size=None):
+    """
+    Yield (alternative_ids, utilities) block by block, chunk_size alternatives at
+    a time, so memory stays bounded by the block rather than by the number of
+    alternatives. Weights default to the criterias' own weights.
+    """
+    if criterias is None:
+        criterias = list(Criteria.objects.all())
+    if weights is None:
+        weights = [criteria.weight for criteria in criterias]
+    if chunk_size is None:
+        chunk_size = settings.SMART_CHUNK_SIZE
+    alternative_ids = np.fromiter(Alternative.objects.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    for start in range(0, len(alternative_ids), chunk_size):
+        block = alternative_ids[start:start + chunk_size]
+        matrix = load_criteria_matrix('normalized_mark', criterias, fill=0.0, alternative_ids=block)
+        yield block, weighted_scores(matrix.values, weights)
+
+
+def rank_alternatives(k=None, criterias=None, weights=None, chunk_size=None):
+    """
+    Alternatives by SMART utility, best first: all of them, or the k best. For
+    top-k only the k best candidates of the blocks scored so far are kept.
+    """
+    ids = [np.array([], dtype=np.int64)]
+    scores = [np.array([], dtype=np.float64)]
+    for block_ids, block_scores in score_blocks(criterias, weights, chunk_size):
+        ids.append(block_ids)
+        scores.append(block_scores)
+        if k is not None:
+            ids, scores = [np.concatenate(ids)], [np.concatenate(scores)]
+            keep = top_rows(scores[0], k)
+            ids, scores = [ids[0][keep]], [scores[0][keep]]
+    ids, scores = np.concatenate(ids), np.concatenate(scores)
+    order = top_rows(scores, k)
+    return ScoredAlternatives(ids[order], scores[order])
+
+
+def current_weights(criterias):
+    """
+    Stored weights of the criterias, read from the database rather than from the
+    possibly cached instances: weights are written with queryset updates.
+    """
+    weights = dict(Criteria.objects.filter(id__in=[criteria.id for criteria in criterias]).values_list(
+        'id', 'weight'
+    ))
+    return [weights.get(criteria.id, 0) for criteria in criterias]
+
+
+def decision_matrix():
+    """
+    Normalized marks of every alternative on every criteria, criterias ordered by
+    id, kept in memory between requests until forget_decision_matrix() is called.
+    """
+    global _decision_matrix
+    matrix = _decision_matrix
+    if matrix is not None:
+        return matrix
+    with _decision_matrix_lock:
+        generation = _decision_matrix_generation
+    matrix = load_criteria_matrix('normalized_mark', Criteria.objects.order_by('id'), fill=0.0)
+    with _decision_matrix_lock:
+        # A change committed while loading leaves the loaded matrix stale.
+        if generation == _decision_matrix_generation:
+            _decision_matrix = matrix
+    return matrix
+
+
+def decision_matrix_generation():
+    """
+    Counter moved forward by every forget_decision_matrix(), for values derived
+    from the marks and kept in memory along with the decision matrix.
+    """
+    with _decision_matrix_lock:
+        return _decision_matrix_generation
+
+
+def forget_decision_matrix():
+    global _decision_matrix, _decision_matrix_generation
+    with _decision_matrix_lock:
+        _decision_matrix = None
+        _decision_matrix_generation += 1
+
+
+def score_scenarios(weights, k=None, matrix=None):
+    """
+    Rank the alternatives once per weight vector without touching Criteria.weight.
+    weights is a scenarios x criteria array in the column order of the decision
+    matrix. Scenarios are scored as one matrix-matrix product per batch, sized so
+    a batch holds about SMART_CHUNK_SIZE utilities per scenario column. Returns a
+    ScoredAlternatives per scenario, best first, the k best when k is given.
+    """
+    if matrix is None:
+        matrix = decision_matrix()
+    weights = np.asarray(weights, dtype=np.float64).reshape(-1, len(matrix.criterias))
+    ids = np.asarray(matrix.alternative_ids, dtype=np.int64)
+    batch = max(1, settings.SMART_CHUNK_SIZE // max(len(ids), 1))
+    ranked = []
+    for start in range(0, len(weights), batch):
+        scores = weighted_scores(matrix.values, weights[start:start + batch].T)
+        for column in scores.T:
+            order = top_rows(column, k)
+            ranked.append(ScoredAlternatives(ids[order], column[order]))
+    return ranked
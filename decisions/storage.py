@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.db import transaction
+
+from decisions.matrix import MIRRORED_CODES, MIRRORED_RESULTS, RESULT_CODES, RESULT_SIGNS, UNKNOWN, load_pair_cells, \
+    load_pair_matrix, matrix_cells
+from decisions.models import Alternative, LPR, PairCompare
+from decisions.packed import load_packed_matrix, store_packed_matrix, update_packed_cells
+from decisions.ranking import forget_preference_order, load_preference_order, store_preference_order, \
+    weak_order_groups
+
+
+def read_pair_matrix(lpr, alternative_ids):
+    """
+    Dense N x N matrix of the LPR from its most compact representation: the
+    preference ranking when one covers the alternatives, then the packed matrix
+    when that storage is enabled and covers them, then the PairCompare rows.
+    Reads never write; the derived representations are kept by the writes.
+    """
+    order = load_preference_order(lpr)
+    if order is not None and order.covers(alternative_ids):
+        return order.matrix(alternative_ids)
+
+    matrix = load_packed_matrix(lpr, alternative_ids) if settings.PACKED_PAIR_MATRIX else None
+    if matrix is None:
+        matrix = load_pair_matrix(lpr, alternative_ids)
+    return matrix
+
+
+@transaction.atomic
+def refresh_derived_matrix(lpr_id):
+    """
+    Rebuild the packed matrix, when that storage is enabled, and the ranking of
+    the LPR from its rows after a bulk write, which reads all of them anyway.
+    The LPR row is locked first, like the change feed does, so concurrent
+    writers store one after the other.
+    """
+    if not list(LPR.objects.select_for_update().filter(id=lpr_id).values_list('id', flat=True)):
+        return
+    alternative_ids = list(Alternative.objects.order_by('id').values_list('id', flat=True))
+    matrix = load_pair_matrix(lpr_id, alternative_ids)
+    if settings.PACKED_PAIR_MATRIX:
+        store_packed_matrix(lpr_id, alternative_ids, matrix)
+    groups = weak_order_groups(alternative_ids, matrix)
+    if groups is not None:
+        store_preference_order(lpr_id, groups)
+
+
+def read_pair_cells(lpr, alternative_ids):
+    """
+    (rows, columns, codes) of the LPR, read like read_pair_matrix.
+    """
+    if not settings.PACKED_PAIR_MATRIX and load_preference_order(lpr) is None:
+        return load_pair_cells(lpr, alternative_ids)
+    return matrix_cells(read_pair_matrix(lpr, alternative_ids))
+
+
+def read_pair_results(lpr, pairs):
+    """
+    {(first_id, second_id): result} of the pairs, answered from the preference
+    ranking when one covers them and from a single PairCompare query otherwise.
+    """
+    order = load_preference_order(lpr)
+    if order is not None and all(order.code(first, second) != UNKNOWN for first, second in pairs):
+        return {(first, second): str(RESULT_SIGNS[order.code(first, second)]) for first, second in pairs}
+
+    stored = PairCompare.objects.filter(
+        lpr=lpr,
+        first_alternative_id__in={min(pair) for pair in pairs},
+        second_alternative_id__in={max(pair) for pair in pairs}
+    ).values_list('first_alternative_id', 'second_alternative_id', 'result')
+    results = {}
+    for first, second, result in stored:
+        results[(first, second)] = result
+        results[(second, first)] = MIRRORED_RESULTS.get(result, result)
+    return {pair: results[pair] for pair in pairs if results.get(pair)}
+
+
+def read_inferred_pairs(lpr, pairs):
+    """
+    The (first_id, second_id) pairs, in either order, whose comparison was inferred
+    rather than stated, with a single PairCompare query.
+    """
+    inferred = set(PairCompare.objects.filter(
+        lpr=lpr,
+        inferred=True,
+        first_alternative_id__in={min(pair) for pair in pairs},
+        second_alternative_id__in={max(pair) for pair in pairs}
+    ).values_list('first_alternative_id', 'second_alternative_id'))
+    return {pair for pair in pairs if (min(pair), max(pair)) in inferred}
+
+
+def pair_results_changed(lpr_id, results):
+    """
+    Keep the derived representations of the LPR in step with a few changed
+    {(first_id, second_id): result} rows: the ranking is dropped, to be detected
+    again by the next bulk write, and the packed matrix is patched when enabled.
+    """
+    forget_preference_order(lpr_id)
+    if not settings.PACKED_PAIR_MATRIX:
+        return
+    cells = {}
+    for (first, second), result in results.items():
+        if first != second:
+            code = RESULT_CODES.get(result, UNKNOWN)
+            cells[(first, second)] = code
+            cells[(second, first)] = int(MIRRORED_CODES[code])
+    update_packed_cells(lpr_id, cells)
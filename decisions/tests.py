@@ -1,3 +1,815 @@
-from django.test import TestCase
+import itertools
+import json
+import random
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from scipy import sparse
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from decisions.aggregation import rebuild_results
+from decisions.cache import result_cache
+from decisions.changes import last_change, prune_pair_changes
+from decisions.competence import load_compare_matrix, solve_competence
+from decisions.elicitation import MergeSortElicitation, ranking_cells
+from decisions.inference import infer_after_answer, infer_closure
+from decisions.matrix import RESULT_SIGNS, load_pair_matrix, store_pair_results
+from decisions.models import Alternative, Criteria, LPR, LPRCompare, Mark, PackedPairMatrix, PairChange, PairCompare, \
+    Result, Vector
+from decisions.normalization import normalize_marks
+from decisions.notify import evict
+from decisions.packed import load_packed_matrix, pack_codes, store_packed_matrix, unpack_codes, \
+    update_packed_cells
+from decisions.pareto import assign_pareto_layers, non_dominated_sort, pareto_front, pareto_front_ids
+from decisions.ranking import load_preference_order
+from decisions.sensitivity import DIRICHLET, UNIFORM, count_ranks, rank_stability, sample_weights, stability_report
+from decisions.smart import forget_decision_matrix, rank_alternatives, top_rows, weighted_scores
+from decisions.storage import read_pair_matrix, read_pair_results
+from decisions.vectors import store_vectors, vectors_stored
+
+
+class DecisionsTestCase(TestCase):
+    """
+    Ids and data versions repeat across rolled back tests, so the in-process
+    caches keyed by them are emptied before every test.
+    """
+
+    def setUp(self):
+        result_cache.clear()
+        forget_decision_matrix()
+        caches['template_fragments'].clear()
+        self.random = random.Random(7)
+
+    def create_alternatives(self, count):
+        return [Alternative.objects.create(name='Alternative %d' % index) for index in range(count)]
+
+    def create_decision_matrix(self, rows, weights):
+        """
+        Alternatives with the given normalized marks, one row per alternative and
+        one column per criteria of the given weight. Returns (alternatives, criterias).
+        """
+        alternatives = self.create_alternatives(len(rows))
+        criterias = [
+            Criteria.objects.create(name='Criteria %d' % column, weight=weight, criteria_type=Criteria.QUANTITATIVE,
+                                    optimal_type=Criteria.MAXIMUM, measure='points', scale_type='ratio')
+            for column, weight in enumerate(weights)
+        ]
+        for column, criteria in enumerate(criterias):
+            for alternative, row in zip(alternatives, rows):
+                mark = Mark.objects.create(criteria=criteria, name=str(row[column]), rank=0,
+                                           numeric_value=row[column], normalized_mark=row[column])
+                Vector.objects.create(alternative=alternative, mark=mark)
+        return alternatives, criterias
+
+    def random_groups(self, ids):
+        """
+        A random weak order of the ids as tie groups, best first.
+        """
+        ids = list(ids)
+        self.random.shuffle(ids)
+        groups = []
+        for pk in ids:
+            if groups and self.random.random() < 0.3:
+                groups[-1].append(pk)
+            else:
+                groups.append([pk])
+        return groups
+
+
+class ResultMaintenanceTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(ResultMaintenanceTests, self).setUp()
+        self.alternatives = self.create_alternatives(5)
+        self.lprs = [LPR.objects.create(name='LPR %d' % index, rank=index + 1) for index in range(2)]
+
+    def snapshot(self):
+        return (
+            sorted(Result.objects.values_list('lpr_id', 'alternative_id', 'alternative_weight', 'rank')),
+            sorted(Alternative.objects.values_list('id', 'group_weight')),
+        )
+
+    def assert_matches_rebuild(self):
+        maintained = self.snapshot()
+        self.assertEqual(rebuild_results(), (0, 0))
+        self.assertEqual(self.snapshot(), maintained)
+
+    def test_every_pair_has_a_result_row(self):
+        self.assertEqual(Result.objects.count(), len(self.lprs) * len(self.alternatives))
+        self.create_alternatives(1)
+        LPR.objects.create(name='LPR 2', rank=3)
+        self.assertEqual(Result.objects.count(), 3 * 6)
+        self.assert_matches_rebuild()
+
+    def test_saved_and_deleted_comparisons(self):
+        first, second, third = self.alternatives[:3]
+        lpr = self.lprs[0]
+        PairCompare.objects.create(lpr=lpr, first_alternative=first, second_alternative=second, result='>')
+        self.assert_matches_rebuild()
+        compare = PairCompare.objects.create(lpr=lpr, first_alternative=second, second_alternative=third,
+                                             result='=')
+        self.assert_matches_rebuild()
+        compare.result = '<'
+        compare.save()
+        self.assert_matches_rebuild()
+        compare.delete()
+        self.assert_matches_rebuild()
+
+    def test_bulk_stored_comparisons(self):
+        ids = [alternative.id for alternative in self.alternatives]
+        for lpr in self.lprs:
+            store_pair_results(lpr, ranking_cells(self.random_groups(ids)))
+            self.assert_matches_rebuild()
+        store_pair_results(self.lprs[0], ranking_cells(self.random_groups(ids)))
+        self.assert_matches_rebuild()
+
+    def test_lpr_rank_change(self):
+        ids = [alternative.id for alternative in self.alternatives]
+        store_pair_results(self.lprs[1], ranking_cells(self.random_groups(ids)))
+        lpr = LPR.objects.get(id=self.lprs[1].id)
+        lpr.rank = 5
+        lpr.save()
+        self.assert_matches_rebuild()
+
+
+    def test_deleted_alternative(self):
+        ids = [alternative.id for alternative in self.alternatives]
+        for lpr in self.lprs:
+            store_pair_results(lpr, ranking_cells(self.random_groups(ids)))
+        seq = last_change(self.lprs[0].id)
+        Alternative.objects.filter(id__in=ids[:2]).delete()
+        self.assert_matches_rebuild()
+        self.assertEqual(
+            set(PairChange.objects.filter(lpr=self.lprs[0], id__gt=seq).values_list('result', flat=True)), {None}
+        )
+        self.assertEqual(PairChange.objects.filter(lpr=self.lprs[0], id__gt=seq).count(), 4 + 3)
+
+    def test_deleted_lpr(self):
+        ids = [alternative.id for alternative in self.alternatives]
+        for lpr in self.lprs:
+            store_pair_results(lpr, ranking_cells(self.random_groups(ids)))
+        self.lprs[0].delete()
+        self.assert_matches_rebuild()
+
+    def test_delete_queries_do_not_grow_with_comparisons(self):
+        ids = [alternative.id for alternative in self.alternatives]
+        store_pair_results(self.lprs[0], {(ids[0], ids[1]): '>'})
+        store_pair_results(self.lprs[1], ranking_cells(self.random_groups(ids)))
+        with CaptureQueriesContext(connection) as single:
+            LPR.objects.get(id=self.lprs[0].id).delete()
+        with CaptureQueriesContext(connection) as compared:
+            LPR.objects.get(id=self.lprs[1].id).delete()
+        self.assertEqual(len(compared), len(single))
+
+
+class InferenceTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(InferenceTests, self).setUp()
+        self.ids = [alternative.id for alternative in self.create_alternatives(8)]
+        self.incremental = LPR.objects.create(name='Incremental', rank=1)
+        self.closure = LPR.objects.create(name='Closure', rank=2)
+
+    def answer(self, first_id, second_id, result):
+        store_pair_results(self.incremental, {(first_id, second_id): result})
+        infer_after_answer(self.incremental, first_id, second_id, result)
+        store_pair_results(self.closure, {(first_id, second_id): result})
+
+    def assert_same_closure(self):
+        infer_closure(self.closure)
+        for inferred in (False, True):
+            np.testing.assert_array_equal(
+                load_pair_matrix(self.incremental, self.ids, inferred=inferred),
+                load_pair_matrix(self.closure, self.ids, inferred=inferred)
+            )
+
+    def test_consistent_answers(self):
+        cells = ranking_cells(self.random_groups(self.ids))
+        pairs = list(itertools.combinations(self.ids, 2))
+        self.random.shuffle(pairs)
+        for first_id, second_id in pairs[:12]:
+            self.answer(first_id, second_id, cells[(first_id, second_id)])
+            self.assert_same_closure()
+
+    def test_contradicting_answer(self):
+        first_id, second_id, third_id = self.ids[:3]
+        self.answer(first_id, second_id, '>')
+        self.answer(second_id, third_id, '>')
+        self.answer(third_id, first_id, '>')
+        self.assert_same_closure()
+
+
+class DerivedMatrixTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(DerivedMatrixTests, self).setUp()
+        self.ids = [alternative.id for alternative in self.create_alternatives(6)]
+        self.lpr = LPR.objects.create(name='LPR', rank=1)
+
+    def assert_reads_rows(self):
+        lpr = LPR.objects.get(id=self.lpr.id)
+        np.testing.assert_array_equal(read_pair_matrix(lpr, self.ids), load_pair_matrix(lpr, self.ids))
+        pairs = [(first, second) for first in self.ids for second in self.ids if first != second]
+        rows = load_pair_matrix(lpr, self.ids)
+        self.assertEqual(read_pair_results(lpr, pairs), {
+            (first, second): str(RESULT_SIGNS[rows[self.ids.index(first), self.ids.index(second)]])
+            for first, second in pairs if rows[self.ids.index(first), self.ids.index(second)]
+        })
+
+    def test_bulk_write_stores_the_ranking(self):
+        groups = self.random_groups(self.ids)
+        store_pair_results(self.lpr, ranking_cells(groups))
+        self.assertEqual(sorted(map(sorted, load_preference_order(self.lpr).groups)), sorted(map(sorted, groups)))
+        self.assert_reads_rows()
+
+    def test_incomplete_order_is_not_stored(self):
+        store_pair_results(self.lpr, {(self.ids[0], self.ids[1]): '>'})
+        self.assertIsNone(load_preference_order(self.lpr))
+        self.assert_reads_rows()
+
+    def test_single_save_drops_the_ranking(self):
+        store_pair_results(self.lpr, ranking_cells([self.ids]))
+        compare = PairCompare.objects.get(lpr=self.lpr, first_alternative_id=self.ids[0],
+                                          second_alternative_id=self.ids[1])
+        compare.result = '>'
+        compare.save()
+        self.assertIsNone(load_preference_order(self.lpr))
+        self.assert_reads_rows()
+
+    @override_settings(PACKED_PAIR_MATRIX=True)
+    def test_packed_matrix_follows_the_writes(self):
+        store_pair_results(self.lpr, {(self.ids[0], self.ids[1]): '>', (self.ids[2], self.ids[3]): '='})
+        np.testing.assert_array_equal(load_packed_matrix(self.lpr, self.ids), load_pair_matrix(self.lpr, self.ids))
+        PairCompare.objects.create(lpr=self.lpr, first_alternative_id=self.ids[4], second_alternative_id=self.ids[5],
+                                   result='<')
+        np.testing.assert_array_equal(load_packed_matrix(self.lpr, self.ids), load_pair_matrix(self.lpr, self.ids))
+        self.assert_reads_rows()
+
+    @override_settings(PACKED_PAIR_MATRIX=True)
+    def test_reads_do_not_write(self):
+        self.client.force_login(User.objects.create_user('expert', password='expert'))
+        store_pair_results(self.lpr, {(self.ids[0], self.ids[1]): '>'})
+        PackedPairMatrix.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            for url in (reverse('get-results', args=[self.lpr.id]), reverse('api-results', args=[self.lpr.id])):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        statements = [query['sql'].split()[0].upper() for query in queries]
+        self.assertEqual(set(statements), {'SELECT'})
+        self.assertFalse(any('FOR UPDATE' in query['sql'] for query in queries))
+
+
+class AltCompareTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(AltCompareTests, self).setUp()
+        self.client.force_login(User.objects.create_user('expert', password='expert'))
+        self.ids = [alternative.id for alternative in self.create_alternatives(4)]
+        self.lpr = LPR.objects.create(name='LPR', rank=1)
+        self.url = reverse('start-incidence', args=[self.lpr.id])
+
+    def page_data(self, answer):
+        """
+        POST data of the rendered page, every pair answered with answer(first_id, second_id).
+        """
+        formset = self.client.get(self.url).context['formset']
+        data = {'compare-%s' % key: value for key, value in formset.management_form.initial.items()}
+        for index, form in enumerate(formset):
+            first_id, second_id = form.initial['first_id'], form.initial['second_id']
+            data['compare-%d-first_id' % index] = first_id
+            data['compare-%d-second_id' % index] = second_id
+            data['compare-%d-compare' % index] = answer(first_id, second_id)
+        return data
+
+    def stated(self):
+        return dict(((first, second), result) for first, second, result in PairCompare.objects.filter(
+            lpr=self.lpr, inferred=False
+        ).values_list('first_alternative_id', 'second_alternative_id', 'result'))
+
+    def test_inferred_pairs_are_not_asked(self):
+        first_id, second_id, third_id = self.ids[:3]
+        store_pair_results(self.lpr, {(first_id, second_id): '>', (second_id, third_id): '>'})
+        infer_closure(self.lpr)
+        pairs = [
+            (form.initial['first_id'], form.initial['second_id'])
+            for form in self.client.get(self.url).context['formset']
+        ]
+        self.assertEqual(len(pairs), 5)
+        self.assertNotIn((first_id, third_id), pairs)
+
+    def test_answers_follow_their_pair(self):
+        cells = ranking_cells(self.random_groups(self.ids))
+        data = self.page_data(lambda first_id, second_id: cells[(first_id, second_id)])
+        first_id, second_id, third_id = self.ids[:3]
+        store_pair_results(self.lpr, {(first_id, second_id): '>', (second_id, third_id): '>'})
+        infer_closure(self.lpr)
+
+        self.assertEqual(self.client.post(self.url, data).status_code, 302)
+        self.assertEqual(self.stated(), {pair: cells[pair] for pair in itertools.combinations(self.ids, 2)})
+
+    @override_settings(ALT_COMPARE_PAGE_SIZE=3)
+    def test_page_batch_infers_the_closure(self):
+        cells = ranking_cells([self.ids[:2], self.ids[2:3], self.ids[3:]])
+        self.client.post(self.url, self.page_data(lambda first_id, second_id: cells[(first_id, second_id)]))
+        maintained = load_pair_matrix(self.lpr, self.ids, inferred=True)
+        self.assertTrue(maintained.any())
+        infer_closure(self.lpr)
+        np.testing.assert_array_equal(load_pair_matrix(self.lpr, self.ids, inferred=True), maintained)
+
+
+class IncidenceMatrixTests(DecisionsTestCase):
+
+    def test_cached_rows_render_again(self):
+        self.client.force_login(User.objects.create_user('expert', password='expert'))
+        first, second, third = [alternative.id for alternative in self.create_alternatives(3)]
+        lpr = LPR.objects.create(name='LPR', rank=1)
+        store_pair_results(lpr, {(first, second): '>', (second, third): '='})
+        url = reverse('incidence-matrix', args=[lpr.id])
+
+        cells = self.client.get(url).content.decode('utf-8').count('<td')
+        self.assertEqual(cells, 3 * 3)
+        caches['template_fragments'].clear()
+        self.assertEqual(self.client.get(url).content.decode('utf-8').count('<td'), cells)
+
+
+class CacheNotificationTests(DecisionsTestCase):
+
+    def test_evict(self):
+        result_cache.set(('compare-alternatives', 1, 0, 1, 2), 'marks')
+        result_cache.set(('result-matrix', 1, 0), 'comparisons')
+        evict({'criteria': 3})
+        self.assertEqual(list(result_cache.entries), [('result-matrix', 1, 0)])
+        evict({})
+        self.assertEqual(len(result_cache), 0)
+
+    def test_comparisons_do_not_notify(self):
+        first, second = [alternative.id for alternative in self.create_alternatives(2)]
+        lpr = LPR.objects.create(name='LPR', rank=1)
+        with mock.patch('decisions.signals.notify_change') as notify_change:
+            store_pair_results(lpr, {(first, second): '>'})
+            PairCompare.objects.filter(lpr=lpr).get().delete()
+            self.assertFalse(notify_change.called)
+            Alternative.objects.create(name='Alternative')
+            notify_change.assert_called_once_with()
+
+
+class PackedMatrixTests(DecisionsTestCase):
+
+    def random_codes(self, size):
+        return np.random.RandomState(size).randint(0, 4, (size, size)).astype(np.int8)
+
+    def test_round_trip(self):
+        for size in range(10):
+            codes = self.random_codes(size)
+            packed = pack_codes(codes)
+            self.assertEqual(len(packed), -(-size * size // 4))
+            np.testing.assert_array_equal(unpack_codes(packed, size), codes)
+
+    @override_settings(PACKED_PAIR_MATRIX=True)
+    def test_patched_cells(self):
+        ids = [alternative.id for alternative in self.create_alternatives(7)]
+        lpr = LPR.objects.create(name='Packed', rank=1)
+        codes = self.random_codes(len(ids))
+        store_packed_matrix(lpr.id, ids, codes)
+        for count in (1, 3, 20):
+            cells = {}
+            for _ in range(count):
+                row, column = self.random.randrange(len(ids)), self.random.randrange(len(ids))
+                cells[(ids[row], ids[column])] = self.random.randrange(4)
+                codes[row, column] = cells[(ids[row], ids[column])]
+            update_packed_cells(lpr.id, cells)
+            np.testing.assert_array_equal(load_packed_matrix(lpr, ids), codes)
+
+    @override_settings(PACKED_PAIR_MATRIX=True)
+    def test_unknown_alternative_drops_the_matrix(self):
+        ids = [alternative.id for alternative in self.create_alternatives(3)]
+        lpr = LPR.objects.create(name='Packed', rank=1)
+        store_packed_matrix(lpr.id, ids, self.random_codes(len(ids)))
+        update_packed_cells(lpr.id, {(ids[0], max(ids) + 1): 1})
+        self.assertIsNone(load_packed_matrix(lpr, ids))
+
+
+class MergeSortElicitationTests(SimpleTestCase):
+
+    def sort(self, groups):
+        position = {pk: index for index, group in enumerate(groups) for pk in group}
+        ids = sorted(position)
+        sorter = MergeSortElicitation.start(ids)
+        while not sorter.done:
+            first, second = sorter.next_pair()
+            sorter.answer('>' if position[first] < position[second] else '<' if position[first] > position[second]
+                          else '=')
+        return sorter
+
+    def test_ranking(self):
+        groups = [[4], [1, 6], [2], [0, 3, 5], [7]]
+        sorter = self.sort(groups)
+        self.assertEqual([sorted(group) for group in sorter.ranking()], groups)
+
+    def test_question_count(self):
+        for size in (0, 1, 2, 5, 16, 33):
+            ids = list(range(size))
+            random.Random(size).shuffle(ids)
+            sorter = self.sort([[pk] for pk in ids])
+            self.assertEqual(sorter.ranking(), [[pk] for pk in ids])
+            self.assertLessEqual(sorter.answers, sorter.expected_answers)
+
+    def test_state_resumes_from_a_copy(self):
+        sorter = MergeSortElicitation.start([1, 2, 3])
+        sorter.answer('<')
+        resumed = MergeSortElicitation(dict(sorter.state))
+        self.assertEqual(resumed.next_pair(), sorter.next_pair())
+        self.assertEqual(resumed.answers, 1)
+
+    def test_unknown_answer(self):
+        with self.assertRaises(ValueError):
+            MergeSortElicitation.start([1, 2]).answer('?')
+
+
+class CompetenceTests(DecisionsTestCase):
+
+    def random_matrix(self, size):
+        values = np.array([[self.random.randint(1, 10) for _ in range(size)] for _ in range(size)], dtype=np.float64)
+        np.fill_diagonal(values, 0)
+        return sparse.csr_matrix(values)
+
+    def test_converges_to_the_principal_eigenvector(self):
+        matrix = self.random_matrix(6)
+        solution = solve_competence(matrix, tolerance=1e-12)
+        values, vectors = np.linalg.eig(matrix.T.toarray())
+        principal = np.abs(vectors[:, np.argmax(values.real)].real)
+        self.assertLess(solution.residual, 1e-12)
+        self.assertAlmostEqual(solution.weights.sum(), 1.0)
+        np.testing.assert_allclose(solution.weights, principal / principal.sum(), atol=1e-9)
+
+    def test_warm_start(self):
+        matrix = self.random_matrix(6)
+        cold = solve_competence(matrix, tolerance=1e-9)
+        warm = solve_competence(matrix, initial=cold.weights * 100, tolerance=1e-9)
+        self.assertLess(warm.iterations, cold.iterations)
+        np.testing.assert_allclose(warm.weights, cold.weights, atol=1e-8)
+
+    def test_no_comparisons(self):
+        solution = solve_competence(sparse.csr_matrix((3, 3)))
+        np.testing.assert_allclose(solution.weights, [1 / 3.0] * 3)
+        self.assertEqual(solve_competence(sparse.csr_matrix((0, 0))).weights.size, 0)
+
+    def test_compare_matrix(self):
+        lprs = [LPR.objects.create(name='LPR %d' % index, rank=1) for index in range(3)]
+        LPRCompare.objects.create(master_lpr=lprs[0], target_lpr=lprs[1], result=7)
+        LPRCompare.objects.create(master_lpr=lprs[2], target_lpr=lprs[0], result=3)
+        LPRCompare.objects.create(master_lpr=lprs[1], target_lpr=lprs[2], result=None)
+        ids = [lprs[2].id, lprs[0].id, lprs[1].id]
+        with self.assertNumQueries(1):
+            matrix = load_compare_matrix(ids)
+        self.assertEqual(matrix.toarray().tolist(), [[0, 3, 0], [0, 0, 7], [0, 0, 0]])
+        self.assertEqual(load_compare_matrix(ids[1:]).toarray().tolist(), [[0, 7], [0, 0]])
+
+
+class ParetoFrontTests(DecisionsTestCase):
+
+    def brute_force_front(self, values):
+        return [
+            row for row, value in enumerate(values)
+            if not any(all(other >= value) and any(other > value) for other in values)
+        ]
+
+    def test_matches_brute_force(self):
+        for size, columns in ((0, 2), (1, 3), (40, 1), (60, 2), (80, 3), (50, 5)):
+            # A narrow value range gives ties and duplicate rows.
+            values = np.array([self.random.randint(0, 4) for _ in range(size * columns)]).reshape(size, columns)
+            for block_size in (1, 7, 1024):
+                self.assertEqual(pareto_front(values, block_size).tolist(), self.brute_force_front(values),
+                                 (size, columns, block_size))
+
+    def test_front_ids(self):
+        alternatives, criterias = self.create_decision_matrix([[3, 1], [1, 3], [2, 2], [1, 1], [3, 1]], [1, 1])
+        ids = [alternative.id for alternative in alternatives]
+        self.assertEqual(pareto_front_ids(), [ids[0], ids[1], ids[2], ids[4]])
+        mark = Mark.objects.get(criteria=criterias[0], vector__alternative_id=ids[3])
+        mark.numeric_value = 4
+        mark.save()
+        self.assertEqual(pareto_front_ids(), [ids[1], ids[2], ids[3]])
+
+
+class ParetoLayerTests(DecisionsTestCase):
+
+    def brute_force_layers(self, values):
+        layers = [0] * len(values)
+        remaining = list(range(len(values)))
+        layer = 0
+        while remaining:
+            layer += 1
+            front = [
+                row for row in remaining
+                if not any(all(values[other] >= values[row]) and any(values[other] > values[row])
+                           for other in remaining)
+            ]
+            for row in front:
+                layers[row] = layer
+            remaining = [row for row in remaining if row not in front]
+        return layers
+
+    def test_matches_brute_force(self):
+        for size, columns in ((0, 2), (1, 2), (40, 1), (60, 2), (50, 4)):
+            values = np.array([self.random.randint(0, 4) for _ in range(size * columns)]).reshape(size, columns)
+            for block_size in (1, 7, 128):
+                self.assertEqual(non_dominated_sort(values, block_size).tolist(), self.brute_force_layers(values),
+                                 (size, columns, block_size))
+
+    def test_stored_layers(self):
+        alternatives, criterias = self.create_decision_matrix([[3, 1], [2, 0], [1, 1], [0, 0], [0, 2]], [1, 1])
+        criterias[1].optimal_type = Criteria.MINIMUM
+        criterias[1].save()
+        ids = [alternative.id for alternative in alternatives]
+        self.assertEqual(assign_pareto_layers(), {ids[0]: 1, ids[1]: 1, ids[2]: 2, ids[3]: 2, ids[4]: 3})
+        self.assertEqual(dict(Alternative.objects.values_list('id', 'pareto_layer')),
+                         {ids[0]: 1, ids[1]: 1, ids[2]: 2, ids[3]: 2, ids[4]: 3})
+
+
+class NormalizationTests(DecisionsTestCase):
+
+    def create_criteria(self, optimal_type, values):
+        criteria = Criteria.objects.create(name='Criteria', weight=1, criteria_type=Criteria.QUANTITATIVE,
+                                           optimal_type=optimal_type, measure='points', scale_type='ratio')
+        for value in values:
+            Mark.objects.create(criteria=criteria, name=str(value), rank=0, numeric_value=value, normalized_mark=7)
+        return criteria
+
+    def normalized(self, criteria):
+        return list(criteria.mark_set.order_by('id').values_list('normalized_mark', flat=True))
+
+    def test_normalized_marks(self):
+        maximum = self.create_criteria(Criteria.MAXIMUM, [50, 30, 0])
+        minimum = self.create_criteria(Criteria.MINIMUM, [20, 40, 30])
+        zero = self.create_criteria(Criteria.MINIMUM, [0, 10])
+        untyped = self.create_criteria(None, [10, 20])
+        self.assertEqual(normalize_marks(), 8)
+        self.assertEqual(self.normalized(maximum), [100, 60, 0])
+        self.assertEqual(self.normalized(minimum), [100, 50, 66])
+        self.assertEqual(self.normalized(zero), [None, 0])
+        self.assertEqual(self.normalized(untyped), [7, 7])
+        self.assertEqual(normalize_marks(), 0)
+
+    def test_only_changed_marks_are_written(self):
+        maximum = self.create_criteria(Criteria.MAXIMUM, [50, 30, 10])
+        other = self.create_criteria(Criteria.MAXIMUM, [50])
+        self.assertEqual(normalize_marks([maximum.id]), 3)
+        self.assertEqual(self.normalized(other), [7])
+        maximum.mark_set.filter(numeric_value=30).update(numeric_value=40)
+        self.assertEqual(normalize_marks([maximum.id, other.id]), 2)
+        self.assertEqual(self.normalized(maximum), [100, 80, 20])
+        self.assertEqual(self.normalized(other), [100])
+        self.assertEqual(normalize_marks([]), 0)
+
+
+class VectorStorageTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(VectorStorageTests, self).setUp()
+        self.alternative = self.create_alternatives(1)[0]
+        self.marks = []
+        for column in range(3):
+            criteria = Criteria.objects.create(name='Criteria %d' % column, weight=1,
+                                               criteria_type=Criteria.QUANTITATIVE, optimal_type=Criteria.MAXIMUM,
+                                               measure='points', scale_type='ratio')
+            self.marks.append([Mark.objects.create(criteria=criteria, name=str(value), rank=0, numeric_value=value)
+                               for value in range(2)])
+        self.stored = mock.Mock()
+        vectors_stored.connect(self.stored)
+        self.addCleanup(vectors_stored.disconnect, self.stored)
+
+    def vectors(self):
+        return dict(Vector.objects.filter(alternative=self.alternative).values_list('mark__criteria_id', 'id'))
+
+    def test_diff(self):
+        self.assertEqual(store_vectors(self.alternative, [self.marks[0][0], self.marks[1][0]]), 2)
+        first = self.vectors()
+        Vector.objects.create(alternative=self.alternative, mark=self.marks[0][0])
+        self.assertEqual(store_vectors(self.alternative, [self.marks[0][1], self.marks[2][0]]), 4)
+        self.assertEqual(sorted(Vector.objects.filter(alternative=self.alternative).values_list('mark_id', flat=True)),
+                         [self.marks[0][1].id, self.marks[2][0].id])
+        self.assertEqual(self.vectors()[self.marks[0][1].criteria_id], first[self.marks[0][0].criteria_id])
+        self.assertEqual(self.stored.call_count, 2)
+
+    def test_unchanged(self):
+        store_vectors(self.alternative, [self.marks[0][0], self.marks[1][0]])
+        vectors = self.vectors()
+        self.assertEqual(store_vectors(self.alternative, [self.marks[1][0], self.marks[0][0]]), 0)
+        self.assertEqual(self.vectors(), vectors)
+        self.assertEqual(self.stored.call_count, 1)
+
+
+class SmartScoringTests(DecisionsTestCase):
+
+    def test_weighted_scores(self):
+        values = np.array([[100, 0], [np.nan, 50]])
+        np.testing.assert_allclose(weighted_scores(values, [3, 1]), [75, 12.5])
+        np.testing.assert_allclose(weighted_scores(values, [[3, 0], [1, 0]]), [[75, 0], [12.5, 0]])
+
+    def test_top_rows(self):
+        for size in (0, 1, 10, 50):
+            distinct = np.array(self.random.sample(range(1000), size), dtype=np.float64)
+            tied = np.array([self.random.randint(0, 5) for _ in range(size)], dtype=np.float64)
+            self.assertEqual(top_rows(tied).tolist(), sorted(range(size), key=lambda row: -tied[row]))
+            for k in (0, 1, 3, size, size + 1):
+                self.assertEqual(top_rows(distinct, k).tolist(), top_rows(distinct)[:k].tolist(), (size, k))
+                self.assertEqual(tied[top_rows(tied, k)].tolist(), tied[top_rows(tied)][:k].tolist(), (size, k))
+
+    def test_ranked_in_blocks(self):
+        rows = [[self.random.randint(0, 100) for _ in range(3)] for _ in range(20)]
+        alternatives, criterias = self.create_decision_matrix(rows, [3, 2, 1])
+        expected = {
+            alternative.id: np.dot(row, [3, 2, 1]) / 6.0 for alternative, row in zip(alternatives, rows)
+        }
+        best = sorted(expected.values(), reverse=True)
+        for chunk_size in (1, 3, 20, 100):
+            for k in (None, 0, 1, 5, 25):
+                ranked = rank_alternatives(k, criterias, chunk_size=chunk_size)
+                np.testing.assert_allclose(ranked.scores, best[:k], err_msg=str((chunk_size, k)))
+                np.testing.assert_allclose([expected[pk] for pk in ranked.alternative_ids.tolist()], ranked.scores)
+        ranked = rank_alternatives(criterias=criterias, weights=[0, 0, 1], chunk_size=7)
+        self.assertEqual(ranked.scores.tolist(), sorted((float(row[2]) for row in rows), reverse=True))
+
+
+class RankStabilityTests(DecisionsTestCase):
+
+    def test_sample_weights(self):
+        for method in (DIRICHLET, UNIFORM):
+            sampled = sample_weights([2, 0, 6], 50, method, random_state=1)
+            self.assertEqual(sampled.shape, (50, 3))
+            np.testing.assert_allclose(sampled.sum(axis=1), 1)
+            self.assertFalse(sampled[:, 1].any())
+            np.testing.assert_array_equal(sampled, sample_weights([2, 0, 6], 50, method, random_state=1))
+        ratios = sample_weights([1, 1], 50, UNIFORM, spread=0.2, random_state=1)
+        self.assertTrue(((ratios[:, 0] / ratios[:, 1] >= 0.8 / 1.2) & (ratios[:, 0] / ratios[:, 1] <= 1.2 / 0.8)).all())
+        with self.assertRaises(ValueError):
+            sample_weights([1], 1, 'normal')
+
+    def test_count_ranks(self):
+        values = np.array([[0, 100], [100, 0], [50, 50]])
+        counts = count_ranks(values, np.array([[1, 0], [0, 1], [0.5, 0.5]]))
+        # The last scenario ties every row, which keeps the row order.
+        self.assertEqual(counts.tolist(), [[2, 0, 1], [1, 1, 1], [0, 2, 1]])
+
+    @override_settings(RANK_STABILITY_WORKERS=1)
+    def test_rank_stability(self):
+        alternatives, criterias = self.create_decision_matrix([[10, 10], [100, 100], [80, 0], [0, 60]], [1, 1])
+        stability = rank_stability(samples=300, random_state=5)
+        self.assertEqual(stability.alternative_ids.tolist(), [alternative.id for alternative in alternatives])
+        self.assertEqual(stability.samples, 300)
+        self.assertEqual(stability.rank_counts.sum(axis=0).tolist(), [300] * 4)
+        self.assertEqual(stability.rank_counts.sum(axis=1).tolist(), [300] * 4)
+        self.assertEqual(stability.rank_counts[1].tolist(), [300, 0, 0, 0])
+        self.assertEqual(stability.rank_counts[0].tolist(), [0, 0, 0, 300])
+        np.testing.assert_array_equal(rank_stability(samples=300, random_state=5).rank_counts, stability.rank_counts)
+
+        report = stability_report(stability)
+        self.assertEqual(report[0], (alternatives[1].id, 1.0, 1.0, (1, 1)))
+        self.assertEqual(report[-1], (alternatives[0].id, 0.0, 4.0, (4, 4)))
+        for pk, best, mean, (low, high) in report:
+            self.assertTrue(0 <= best <= 1 and 1 <= mean <= 4 and 1 <= low <= high <= 4, pk)
+
+    def test_split_across_workers(self):
+        self.create_decision_matrix([[10, 10], [100, 100], [80, 0], [0, 60]], [1, 1])
+        stability = rank_stability(samples=101, workers=2, random_state=5)
+        self.assertEqual(stability.rank_counts.sum(axis=0).tolist(), [101] * 4)
+        self.assertEqual(stability.rank_counts[1, 0], 101)
+
+    def test_nothing_to_sample(self):
+        self.create_decision_matrix([[10, 10]], [0, 0])
+        stability = rank_stability(samples=10, workers=1)
+        self.assertEqual(stability.samples, 0)
+        self.assertEqual(stability_report(stability), [])
+
+
+class ApiTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(ApiTests, self).setUp()
+        self.client.force_login(User.objects.create_user('expert', password='expert'))
+        self.alternatives = self.create_alternatives(4)
+        self.lpr = LPR.objects.create(name='LPR', rank=1)
+
+    def compare(self, first, second, result):
+        store_pair_results(self.lpr, {(first.id, second.id): result})
+
+    def test_result_matrix_etag(self):
+        url = reverse('api-results', args=[self.lpr.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.compare(self.alternatives[0], self.alternatives[1], '>')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['seq'], last_change(self.lpr.id))
+
+    def test_group_results_etag(self):
+        url = reverse('api-group-results')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.compare(self.alternatives[2], self.alternatives[3], '<')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_lpr(self):
+        self.assertEqual(self.client.get(reverse('api-results', args=[self.lpr.id + 1])).status_code, 404)
+
+    @override_settings(PAIR_CHANGES_PAGE_SIZE=2)
+    def test_change_feed_paging(self):
+        first, second, third = self.alternatives[:3]
+        self.compare(first, second, '>')
+        self.compare(second, third, '=')
+        self.compare(first, third, '<')
+        url = reverse('api-changes', args=[self.lpr.id])
+
+        page = self.client.get(url, {'since': 0}).json()
+        self.assertTrue(page['more'])
+        self.assertEqual([change[1:4] for change in page['changes']], [
+            [first.id, second.id, '>'], [second.id, third.id, '='],
+        ])
+        page = self.client.get(url, {'since': page['seq']}).json()
+        self.assertFalse(page['more'])
+        self.assertEqual([change[1:4] for change in page['changes']], [[first.id, third.id, '<']])
+        self.assertEqual(self.client.get(url, {'since': page['seq']}).json()['changes'], [])
+
+    def test_change_feed_resync(self):
+        first, second, third = self.alternatives[:3]
+        self.compare(first, second, '>')
+        self.compare(second, third, '>')
+        url = reverse('api-changes', args=[self.lpr.id])
+        seq = self.client.get(url, {'since': 0}).json()['seq']
+
+        prune_pair_changes(1)
+        response = self.client.get(url, {'since': 0})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json(), {'resync_required': True, 'seq': seq})
+        self.assertEqual(self.client.get(url, {'since': seq}).status_code, 200)
+
+    def test_changes_outlive_their_lpr_until_pruned(self):
+        self.compare(self.alternatives[0], self.alternatives[1], '>')
+        lpr_id = self.lpr.id
+        changes = PairChange.objects.filter(lpr_id=lpr_id).count()
+        self.lpr.delete()
+        self.assertEqual(PairChange.objects.filter(lpr_id=lpr_id).count(), changes)
+        self.assertEqual(prune_pair_changes(10), changes)
+        self.assertFalse(PairChange.objects.filter(lpr_id=lpr_id).exists())
+
+    def test_change_feed_since(self):
+        url = reverse('api-changes', args=[self.lpr.id])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': 'abc'}).status_code, 400)
+
+
+class ScenarioScoringTests(DecisionsTestCase):
+
+    def setUp(self):
+        super(ScenarioScoringTests, self).setUp()
+        self.user = User.objects.create_user('expert', password='expert')
+        self.client.force_login(self.user)
+        self.alternatives, self.criterias = self.create_decision_matrix([[100, 0], [0, 100], [50, 50]], [1, 1])
+        self.url = reverse('smart-scenarios')
+
+    def post(self, payload, client=None, **extra):
+        return (client or self.client).post(self.url, json.dumps(payload), content_type='application/json', **extra)
+
+    def weights(self, first, second):
+        return {str(self.criterias[0].id): first, str(self.criterias[1].id): second}
+
+    def test_rankings(self):
+        response = self.post({'top': 2, 'scenarios': [
+            {'name': 'first', 'weights': self.weights(3, 1)},
+            {'name': 'stored'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        first, stored = response.json()['scenarios']
+        ids = [alternative.id for alternative in self.alternatives]
+        self.assertEqual(first['alternative_ids'], [ids[0], ids[2]])
+        self.assertEqual(first['scores'], [75.0, 50.0])
+        self.assertEqual(stored['weights'], [1, 1])
+        self.assertEqual(stored['scores'], [50.0, 50.0])
+
+    def test_invalid_weights(self):
+        for weight in (float('nan'), float('inf'), True, False, -1, '5', None):
+            response = self.post({'scenarios': [{'weights': self.weights(weight, 1)}]})
+            self.assertEqual(response.status_code, 400, weight)
+            self.assertIn('error', json.loads(response.content.decode('utf-8')))
+
+    def test_invalid_payload(self):
+        for payload in ({'top': True, 'scenarios': []}, {'top': -1, 'scenarios': []}, {'scenarios': {}},
+                        {'scenarios': [{'weights': {'0': 1}}]}, {}):
+            self.assertEqual(self.post(payload).status_code, 400, payload)
+
+    def test_csrf_token_required(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(self.post({'scenarios': []}, client).status_code, 403)
+        token = 'a' * 32
+        client.cookies['csrftoken'] = token
+        self.assertEqual(self.post({'scenarios': []}, client, HTTP_X_CSRFTOKEN=token).status_code, 200)
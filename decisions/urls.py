@@ -13,7 +13,9 @@ from decisions.views import VectorListView, VectorDetailView, VectorCreateView,
     create_vectors, list_vectors
 from decisions.views import ResultListView, ResultDetailView, ResultCreateView, ResultDeleteView, ResultUpdateView
 from decisions.views import RankCriteriaView, select_alternative_to_compare, compare_alternatives, get_result_matrix, \
-    get_group_results, compare_lprs, get_lpr_results
+    get_group_results, compare_lprs, get_lpr_results, get_pareto_front, start_elicitation, \
+    get_smart_ranking, score_weight_scenarios, get_rank_stability, get_result_matrix_json, get_group_results_json, \
+    get_lpr_ranks_json, get_pair_changes_json
 
 urlpatterns = [
     url(
@@ -175,6 +177,11 @@ urlpatterns = [
         login_required(compare_alternatives),
         name="compare-smart"
     ),
+    url(
+        r'^lprs/(?P<pk_lpr>[^/]+)/smart-sort/$',
+        login_required(start_elicitation),
+        name="sort-smart"
+    ),
     url(
         r'^lprs/(?P<pk_lpr>[^/]+)/lpr-compare/$',
         login_required(compare_lprs),
@@ -212,4 +219,50 @@ urlpatterns = [
         login_required(get_lpr_results),
         name="lpr-results"
     ),
+
+    # pareto
+    url(
+        r'^pareto/$',
+        login_required(get_pareto_front),
+        name="pareto-front"
+    ),
+
+    # SMART ranking
+    url(
+        r'^smart/ranking/$',
+        login_required(get_smart_ranking),
+        name="smart-ranking"
+    ),
+    url(
+        r'^smart/scenarios/$',
+        login_required(score_weight_scenarios),
+        name="smart-scenarios"
+    ),
+    url(
+        r'^smart/stability/$',
+        login_required(get_rank_stability),
+        name="rank-stability"
+    ),
+
+    # JSON API
+    url(
+        r'^api/lprs/(?P<pk_lpr>\d+)/results/$',
+        login_required(get_result_matrix_json),
+        name="api-results"
+    ),
+    url(
+        r'^api/lprs/(?P<pk_lpr>\d+)/changes/$',
+        login_required(get_pair_changes_json),
+        name="api-changes"
+    ),
+    url(
+        r'^api/group_results/$',
+        login_required(get_group_results_json),
+        name="api-group-results"
+    ),
+    url(
+        r'^api/lpr_ranks/$',
+        login_required(get_lpr_ranks_json),
+        name="api-lpr-ranks"
+    ),
 ]
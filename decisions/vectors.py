@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.dispatch import Signal
+
+from decisions.bulk import update_field
+from decisions.models import Vector
+
+# Sent after store_vectors wrote an alternative's vectors in bulk, bypassing the
+# Vector model signals.
+vectors_stored = Signal(providing_args=['alternative_id'])
+
+
+@transaction.atomic
+def store_vectors(alternative, marks):
+    """
+    Point the alternative's vectors at the given marks, one per criteria, writing
+    only the difference to the stored rows: one bulk insert for new criterias,
+    one UPDATE for changed marks and one DELETE for criterias no longer given.
+    Returns the number of vectors written.
+    """
+    wanted = {mark.criteria_id: mark for mark in marks}
+    kept = {}
+    changed = {}
+    stale = []
+    for pk, mark_id, criteria_id in Vector.objects.filter(alternative=alternative).values_list(
+            'id', 'mark_id', 'mark__criteria_id'):
+        if criteria_id not in wanted or criteria_id in kept:
+            stale.append(pk)
+            continue
+        kept[criteria_id] = pk
+        if mark_id != wanted[criteria_id].id:
+            changed[pk] = wanted[criteria_id].id
+    created = [
+        Vector(alternative=alternative, mark=mark) for criteria_id, mark in wanted.items() if criteria_id not in kept
+    ]
+
+    if stale:
+        Vector.objects.filter(id__in=stale).delete()
+    update_field(Vector, 'mark', changed)
+    Vector.objects.bulk_create(created)
+    if changed or created:
+        vectors_stored.send(sender=Vector, alternative_id=alternative.id)
+    return len(stale) + len(changed) + len(created)
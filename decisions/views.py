@@ -1,24 +1,43 @@
+import base64
 import itertools
+import json
+import math
 from collections import defaultdict
 from operator import attrgetter
 
+from django.conf import settings
 from django.core.checks import messages
-from django.db import DatabaseError
-from django.db.models import F
-from django.db.models import Max, Min
+from django.core.paginator import Paginator
+from django.db import DatabaseError, transaction
 from django.forms import formset_factory
-from django.shortcuts import render, redirect
-from django.urls import reverse_lazy
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic import DetailView, UpdateView, CreateView, DeleteView, View
 from django.views.generic.list import ListView
 
+from decisions.aggregation import refresh_group_weights
+from decisions.bulk import update_field
+from decisions.cache import cached_for_lpr, lprs_etag
+from decisions.changes import last_change, pair_changes_since
+from decisions.competence import load_compare_matrix, solve_competence
+from decisions.elicitation import MergeSortElicitation, ranking_cells
 from decisions.filters import VectorFilter
 from decisions.forms import CreateVectorForm, UpdateVectorForm, LPRCriteriasForm, AlternativeSelectionForm, \
-    LPRCompareForm, AltCompareForm
+    LPRCompareForm, AltCompareForm, RankStabilityForm
+from decisions.graph import IncidenceRows, load_preference_graph, incidence_from_adjacency, pareto_best_rows
+from decisions.inference import infer_after_answer, infer_closure
+from decisions.matrix import load_pair_matrix, best_rows, matrix_signs, store_pair_results, canonical_pair, UNKNOWN, \
+    RESULT_SIGNS
+from decisions.normalization import normalize_marks
+from decisions.pareto import pareto_front_alternatives, assign_pareto_layers
+from decisions.sensitivity import DIRICHLET, rank_stability, stability_report
+from decisions.smart import current_weights, decision_matrix, rank_alternatives, score_scenarios
+from decisions.storage import read_inferred_pairs, read_pair_matrix, read_pair_results
 from decisions.models import Alternative, LPR, Result, Criteria, Mark, Vector, PairCompare, LPRCompare
 
-import networkx as nx
-
 
 ################
 # Alternatives #
@@ -27,6 +46,13 @@ import networkx as nx
 
 class AlternativeListView(ListView):
     model = Alternative
+    orderings = ('name', 'pareto_layer')
+
+    def get_ordering(self):
+        ordering = self.request.GET.get('ordering')
+        if ordering in self.orderings:
+            return [ordering, 'name']
+        return self.ordering
 
 
 class AlternativeUpdateView(UpdateView):
@@ -61,13 +87,6 @@ class AlternativeCreateView(CreateView):
 
     template_name_suffix = '_create'
 
-    def form_valid(self, form):
-        response = super(AlternativeCreateView, self).form_valid(form)
-        for lpr in LPR.objects.all():
-            PairCompare.objects.create(first_alternative=self.object, second_alternative=self.object, result="=",
-                                       lpr=lpr)
-        return response
-
     def get_success_url(self):
         return reverse_lazy('alternative-list')
 
@@ -98,14 +117,7 @@ class CriteriaUpdateView(UpdateView):
 
     def form_valid(self, form):
         response = super(CriteriaUpdateView, self).form_valid(form)
-        if self.object.optimal_type == "max":
-            top = Mark.objects.filter(criteria=self.object).aggregate(Max('numeric_value'))
-            top = top["numeric_value__max"]
-            Mark.objects.filter(criteria=self.object).update(normalized_mark=(F("numeric_value") * 100 / top))
-        elif self.object.optimal_type == "min":
-            top = Mark.objects.filter(criteria=self.object).aggregate(Min('numeric_value'))
-            top = top["numeric_value__min"]
-            Mark.objects.filter(criteria=self.object).update(normalized_mark=(top * 100 / F("numeric_value")))
+        normalize_marks([self.object.id])
         return response
 
     def get_success_url(self):
@@ -228,14 +240,7 @@ class MarkUpdateView(UpdateView):
 
     def form_valid(self, form):
         response = super(MarkUpdateView, self).form_valid(form)
-        if self.object.criteria.optimal_type == "max":
-            top = Mark.objects.filter(criteria=self.object.criteria).aggregate(Max('numeric_value'))
-            top = top["numeric_value__max"]
-            Mark.objects.filter(criteria=self.object.criteria).update(normalized_mark=(F("numeric_value") * 100 / top))
-        elif self.object.criteria.optimal_type == "min":
-            top = Mark.objects.filter(criteria=self.object.criteria).aggregate(Min('numeric_value'))
-            top = top["numeric_value__min"]
-            Mark.objects.filter(criteria=self.object.criteria).update(normalized_mark=(top * 100 / F("numeric_value")))
+        normalize_marks([self.object.criteria_id])
         return response
 
     def get_success_url(self):
@@ -267,14 +272,7 @@ class MarkCreateView(CreateView):
 
     def form_valid(self, form):
         response = super(MarkCreateView, self).form_valid(form)
-        if self.object.criteria.optimal_type == "max":
-            top = Mark.objects.filter(criteria=self.object.criteria).aggregate(Max('numeric_value'))
-            top = top["numeric_value__max"]
-            Mark.objects.filter(criteria=self.object.criteria).update(normalized_mark=(F("numeric_value") * 100 / top))
-        elif self.object.criteria.optimal_type == "min":
-            top = Mark.objects.filter(criteria=self.object.criteria).aggregate(Min('numeric_value'))
-            top = top["numeric_value__min"]
-            Mark.objects.filter(criteria=self.object.criteria).update(normalized_mark=(top * 100 / F("numeric_value")))
+        normalize_marks([self.object.criteria_id])
         return response
 
     def get_success_url(self):
@@ -435,6 +433,7 @@ def select_alternative_to_compare(request, pk_lpr):
                 second_alternative = form.cleaned_data['second_alternative'].id
                 request.session['first_alternative'] = first_alternative
                 request.session['second_alternative'] = second_alternative
+                request.session.pop('elicitation', None)
                 return redirect(reverse_lazy('compare-smart', kwargs={'pk_lpr': str(pk_lpr)}))
     else:
         form = AlternativeSelectionForm()
@@ -444,164 +443,159 @@ def select_alternative_to_compare(request, pk_lpr):
     })
 
 
-def compare_alternatives(request, pk_lpr):
+def criteria_advantages(first_id, second_id):
+    """
+    Marks on which each of the two alternatives beats the other, best first.
+    """
     first_plus = []
     first_minus = []
     second_plus = []
     second_minus = []
+    first_set = Alternative.objects.get(id=first_id).vector_set.all()
+    second_set = Alternative.objects.get(id=second_id).vector_set.all()
+    if len(first_set) == len(second_set):
+        for i in range(len(first_set)):
+            if first_set[i].mark.criteria.optimal_type == "max":
+                if int(first_set[i].mark.numeric_value) > int(second_set[i].mark.numeric_value):
+                    first_plus.append(first_set[i])
+                    second_minus.append(second_set[i])
+                elif int(first_set[i].mark.numeric_value) < int(second_set[i].mark.numeric_value):
+                    first_minus.append(first_set[i])
+                    second_plus.append(second_set[i])
+            elif first_set[i].mark.criteria.optimal_type == "min":
+                if int(first_set[i].mark.numeric_value) < int(second_set[i].mark.numeric_value):
+                    first_plus.append(first_set[i])
+                    second_minus.append(second_set[i])
+                elif int(first_set[i].mark.numeric_value) > int(second_set[i].mark.numeric_value):
+                    first_minus.append(first_set[i])
+                    second_plus.append(second_set[i])
+
+    return {
+        'first_plus': sorted(first_plus, key=attrgetter('mark.normalized_mark'), reverse=True),
+        'first_minus': sorted(first_minus, key=attrgetter('mark.normalized_mark'), reverse=True),
+        'second_plus': sorted(second_plus, key=attrgetter('mark.normalized_mark'), reverse=True),
+        'second_minus': sorted(second_minus, key=attrgetter('mark.normalized_mark'), reverse=True),
+    }
+
+
+def compare_alternatives(request, pk_lpr):
     first_alternative = request.session.get('first_alternative'),
     second_alternative = request.session.get('second_alternative')
     obj_lpr = LPR.objects.get(id=pk_lpr)
+    advantages = {'first_plus': [], 'first_minus': [], 'second_plus': [], 'second_minus': []}
 
     if request.method == 'POST':
         first_object = Alternative.objects.get(id=first_alternative[0])
         second_object = Alternative.objects.get(id=second_alternative)
-        # form = AlternativeSelectionForm(request.POST)
-        # if form.is_valid():
-        print(request.POST)
         if ("Choose " + str(first_object)) in request.POST.get(str(first_object), "-"):
-            print("passed")
-            PairCompare.objects.update_or_create(first_alternative=first_object, second_alternative=second_object,
-                                                 lpr=obj_lpr, defaults={"result": ">"})
-            PairCompare.objects.update_or_create(first_alternative=second_object, second_alternative=first_object,
-                                                 lpr=obj_lpr, defaults={"result": "<"})
-            return redirect(reverse_lazy('lpr-list'))
+            result = ">"
         elif "Choose " + str(second_object) in request.POST.get(str(second_object), "-"):
-            PairCompare.objects.update_or_create(first_alternative=second_object, second_alternative=first_object,
-                                                 lpr=obj_lpr, defaults={"result": ">"})
-            PairCompare.objects.update_or_create(first_alternative=first_object, second_alternative=second_object,
-                                                 lpr=obj_lpr, defaults={"result": "<"})
-            return redirect(reverse_lazy('lpr-list'))
+            result = "<"
         elif "Choose both" in request.POST.get("Choose both", "-"):
-            PairCompare.objects.update_or_create(first_alternative=second_object, second_alternative=first_object,
-                                                 lpr=obj_lpr, defaults={"result": "="})
-            PairCompare.objects.update_or_create(first_alternative=first_object, second_alternative=second_object,
-                                                 lpr=obj_lpr, defaults={"result": "="})
+            result = "="
+        else:
+            result = None
+
+        if result:
+            sorter = get_elicitation(request, obj_lpr)
+            if sorter and sorter.next_pair() == (first_object.id, second_object.id):
+                sorter.answer(result)
+                return next_elicitation_step(request, obj_lpr, sorter)
+            first_id, second_id, result = canonical_pair(first_object.id, second_object.id, result)
+            PairCompare.objects.update_or_create(first_alternative_id=first_id, second_alternative_id=second_id,
+                                                 lpr=obj_lpr, defaults={"result": result, "inferred": False})
             return redirect(reverse_lazy('lpr-list'))
     else:
-        first_set = Alternative.objects.get(id=first_alternative[0]).vector_set.all()
-        second_set = Alternative.objects.get(id=second_alternative).vector_set.all()
-        if len(first_set) == len(second_set):
-            for i in range(len(first_set)):
-                if first_set[i].mark.criteria.optimal_type == "max":
-                    if int(first_set[i].mark.numeric_value) > int(second_set[i].mark.numeric_value):
-                        first_plus.append(first_set[i])
-                        second_minus.append(second_set[i])
-                    elif int(first_set[i].mark.numeric_value) < int(second_set[i].mark.numeric_value):
-                        first_minus.append(first_set[i])
-                        second_plus.append(second_set[i])
-                elif first_set[i].mark.criteria.optimal_type == "min":
-                    if int(first_set[i].mark.numeric_value) < int(second_set[i].mark.numeric_value):
-                        first_plus.append(first_set[i])
-                        second_minus.append(second_set[i])
-                    elif int(first_set[i].mark.numeric_value) > int(second_set[i].mark.numeric_value):
-                        first_minus.append(first_set[i])
-                        second_plus.append(second_set[i])
-
-    return render(request, 'SMART/decisions/compare_alternatives.html', {
-        'first_alternative': Alternative.objects.get(id=first_alternative[0]),
-        'second_alternative': Alternative.objects.get(id=second_alternative),
-        'first_plus': sorted(first_plus, key=attrgetter('mark.normalized_mark'), reverse=True),
-        'first_minus': sorted(first_minus, key=attrgetter('mark.normalized_mark'), reverse=True),
-        'second_plus': sorted(second_plus, key=attrgetter('mark.normalized_mark'), reverse=True),
-        'second_minus': sorted(second_minus, key=attrgetter('mark.normalized_mark'), reverse=True),
-        "lpr": LPR.objects.get(id=pk_lpr)
-    })
+        advantages = cached_for_lpr(
+            'compare-alternatives', obj_lpr,
+            lambda: criteria_advantages(first_alternative[0], second_alternative),
+            first_alternative[0], second_alternative
+        )
+
+    return render(request, 'SMART/decisions/compare_alternatives.html', dict(
+        advantages,
+        first_alternative=Alternative.objects.get(id=first_alternative[0]),
+        second_alternative=Alternative.objects.get(id=second_alternative),
+        lpr=obj_lpr,
+        elicitation=get_elicitation(request, obj_lpr)
+    ))
+
+
+def get_elicitation(request, obj_lpr):
+    elicitation = request.session.get('elicitation')
+    if elicitation and elicitation['lpr'] == obj_lpr.id:
+        return MergeSortElicitation(elicitation['state'])
+    return None
+
+
+def next_elicitation_step(request, obj_lpr, sorter):
+    if sorter.done:
+        request.session.pop('elicitation', None)
+        store_pair_results(obj_lpr, ranking_cells(sorter.ranking()))
+        return redirect(reverse_lazy('lpr-list'))
+    request.session['elicitation'] = {'lpr': obj_lpr.id, 'state': sorter.state}
+    request.session['first_alternative'], request.session['second_alternative'] = sorter.next_pair()
+    return redirect(reverse_lazy('compare-smart', kwargs={'pk_lpr': str(obj_lpr.id)}))
+
+
+def start_elicitation(request, pk_lpr):
+    obj_lpr = LPR.objects.get(id=pk_lpr)
+    sorter = MergeSortElicitation.start(list(Alternative.objects.order_by('id').values_list('id', flat=True)))
+    return next_elicitation_step(request, obj_lpr, sorter)
+
+
+def result_matrix(obj_lpr):
+    alternatives = list(Alternative.objects.all())
+    alternative_ids = [alternative.id for alternative in alternatives]
+    matrix = read_pair_matrix(obj_lpr, alternative_ids)
+    inferred = (load_pair_matrix(obj_lpr, alternative_ids, inferred=True) != UNKNOWN).tolist()
+    return {
+        "max_alternatives": [alternatives[row] for row in best_rows(matrix)],
+        "alternatives": alternatives,
+        "listed_alts": {
+            alternative: list(zip(signs, flags))
+            for alternative, signs, flags in zip(alternatives, matrix_signs(matrix), inferred)
+        },
+    }
 
 
 def get_result_matrix(request, pk_lpr):
-    pair_compares = PairCompare.objects.filter(lpr=LPR.objects.get(id=pk_lpr))
-    alternatives = Alternative.objects.all()
-    results = []
-    count_sign = []
-    max_alternatives = []
-    listed_alts = []
-    max_sign = 0
+    obj_lpr = LPR.objects.get(id=pk_lpr)
     if request.method == "GET":
-        results = []
-        i = 0
-        for a_alternative in alternatives:
-            results.append([])
-            for s_alternative in alternatives:
-                try:
-                    print(pair_compares.get(
-                        first_alternative=a_alternative,
-                        second_alternative=s_alternative
-                    ))
-                    results[i].append(pair_compares.get(
-                        first_alternative=a_alternative,
-                        second_alternative=s_alternative
-                    ))
-                except PairCompare.DoesNotExist:
-                    results[i].append("")
-
-            i = i + 1
-        for t in range(len(alternatives)):
-            list_len = 0
-            for n in range(len(results[t])):
-                if results[t][n] != "" and results[t][n].result in [">", ">=", "="]:
-                    list_len = list_len + 1
-            if list_len > max_sign:
-                max_alternatives.clear()
-                max_alternatives.append(alternatives[t])
-                max_sign = list_len
-            elif list_len == max_sign:
-                max_alternatives.append(alternatives[t])
-
-        print(max_alternatives)
-
-        listed_alts = dict(zip(alternatives, results))
-
-    return render(request, 'SMART/decisions/results.html', {
-        "max_alternatives": max_alternatives,
-        "alternatives": alternatives,
-        "listed_alts": listed_alts,
-        "lpr": LPR.objects.get(id=pk_lpr)
-    })
+        context = cached_for_lpr('result-matrix', obj_lpr, lambda: result_matrix(obj_lpr))
+    else:
+        context = {"max_alternatives": [], "alternatives": list(Alternative.objects.all()), "listed_alts": []}
+
+    return render(request, 'SMART/decisions/results.html', dict(context, lpr=obj_lpr))
 
 
 def get_group_results(request):
     if request.method == "GET":
-        standard_keys = range(1, len(Alternative.objects.all()) + 1)
-        results = {}
-        alt_results = defaultdict(int)
-        t_results = {}
-        lpr_list = LPR.objects.all()
-        i = 0
-        for lpr in LPR.objects.all():
-            results[lpr] = defaultdict(list)
-            results[lpr] = {key: [] for key in standard_keys}
-            for alternative in Alternative.objects.all():
-                pairs = len(PairCompare.objects.filter(
-                    first_alternative=alternative,
-                    lpr=lpr,
-                    result__in=[">", ">=", "="]
-                ))
-                Result.objects.update_or_create(
-                    lpr=lpr,
-                    alternative=alternative,
-                    rank=1,
-                    defaults={
-                        'alternative_weight': pairs
-                    }
-                )
-                results[lpr][pairs].append(str(alternative))
-                lpr_rank = lpr.rank if lpr.rank is not None else 0
-                alt_results[alternative] += pairs * lpr_rank
-
-        for i in range(1, len(Alternative.objects.all()) + 1):
-            t_results[i] = {}
-            for lpr in lpr_list:
-                t_results[i][lpr] = list(Result.objects.filter(alternative_weight=i, lpr=lpr))
-
-        for i in range(1, len(t_results) + 1):
-            print(t_results[i])
+        alternatives = list(Alternative.objects.all())
+        lpr_list = list(LPR.objects.all())
+        standard_keys = range(len(alternatives))
+        results = {lpr: {key: [] for key in standard_keys} for lpr in lpr_list}
+        alt_results = {alternative: alternative.group_weight for alternative in alternatives} if lpr_list else {}
+        t_results = {i: {lpr: [] for lpr in lpr_list} for i in standard_keys}
+
+        lprs_by_id = {lpr.id: lpr for lpr in lpr_list}
+        weights = {}
+        for result in Result.objects.select_related('alternative').order_by('lpr_id', 'alternative_id'):
+            weights.setdefault((result.lpr_id, result.alternative_id), result.alternative_weight)
+            if result.alternative_weight in t_results:
+                t_results[result.alternative_weight][lprs_by_id[result.lpr_id]].append(result)
+
+        for lpr in lpr_list:
+            for alternative in alternatives:
+                pairs = weights.get((lpr.id, alternative.id), 0)
+                results[lpr].setdefault(pairs, []).append(str(alternative))
 
         return render(request, 'SMART/decisions/group_results.html', {
             "results": results,
-            "alt_results": dict(alt_results),
+            "alt_results": alt_results,
             "t_results": t_results,
-            "lprs": lpr_list
+            "lprs": lpr_list,
+            "data_versions": ','.join('%s:%s:%s' % (lpr.id, lpr.rank, lpr.data_version) for lpr in lpr_list)
         })
 
 
@@ -621,168 +615,311 @@ def compare_lprs(request, pk_lpr):
 
 
 def get_lpr_results(request):
-    lprs = LPR.objects.all()
+    lprs = list(LPR.objects.all())
+    matrix = load_compare_matrix([lpr.id for lpr in lprs])
     lpr_lists = {}
     lpr_results = {}
-    nor_lists = {}
-    plus_results = {}
-    t_results = {}
-    nor_results = {}
-    i = 0
-    for lpr in lprs:
-        lpr_results[lpr] = 0
-        plus_results[lpr] = 0
-        nor_results[lpr] = 0
-        t_results[lpr] = 0
-        nor_lists[lpr] = []
     if request.method == "GET":
-        for lpr_1 in lprs:
-            lpr_lists[lpr_1] = []
-            for lpr_2 in lprs:
-                try:
-                    lpr_lists[lpr_1].append(LPRCompare.objects.get(master_lpr=lpr_2, target_lpr=lpr_1))
-                    lpr_results[lpr_1] += LPRCompare.objects.get(master_lpr=lpr_2, target_lpr=lpr_1).result
-                    nor_lists[lpr_1].append(LPRCompare.objects.get(master_lpr=lpr_2, target_lpr=lpr_1).result)
-                except Exception as e:
-                    lpr_lists[lpr_1].append("")
-                    nor_lists[lpr_1].append(0)
-
-            i += 1
-
-    for lpr in lprs:
-        t_results[lpr] = lpr_results[lpr]
-
-    for i in range(5):
-        for lpr_1 in lprs:
-            for lpr_2 in lprs:
-                try:
-                    plus_results[lpr_1] += t_results[lpr_2] * LPRCompare.objects.get(master_lpr=lpr_2,
-                                                                                     target_lpr=lpr_1).result
-                except Exception as e:
-                    plus_results[lpr_1] += 0
-
-        if i < 4:
-
-            for lpr in lprs:
-                t_results[lpr] = plus_results[lpr]
-                plus_results[lpr] = 0
-
-    nor_sum = sum(plus_results.values())
-    for t, k in plus_results.items():
-        nor_results[t] = int((k / nor_sum) * 100)
-
-    for lpr in lprs:
-        LPR.objects.filter(id=lpr.id).update(rank=nor_results[lpr])
+        received = matrix.T.toarray()
+        for lpr, row in zip(lprs, received):
+            lpr_lists[lpr] = [int(result) if result else "" for result in row]
+            lpr_results[lpr] = int(row.sum())
+
+    ranks = [lpr.rank or 0 for lpr in lprs]
+    solution = solve_competence(matrix, initial=ranks if all(lpr.rank is not None for lpr in lprs) else None)
+    plus_results = {lpr: round(float(weight), 4) for lpr, weight in zip(lprs, solution.weights)}
+    nor_results = {lpr: int(weight * 100) for lpr, weight in zip(lprs, solution.weights)}
+
+    update_field(LPR, 'rank', {lpr.id: nor_results[lpr] for lpr in lprs if lpr.rank != nor_results[lpr]})
+    refresh_group_weights()
 
     return render(request, 'lprs/decisions/lpr_results.html', {
         "nor_results": nor_results,
         "plus_results": plus_results,
         "lpr_lists": lpr_lists,
         "lpr_results": lpr_results,
+        "iterations": solution.iterations,
+        "residual": solution.residual,
         "lprs": lprs
     })
 
 
-def alt_compare(request, pk_lpr):
-    obj_lpr = LPR.objects.get(id=pk_lpr)
-    pair_compares = PairCompare.objects.filter(lpr=LPR.objects.get(id=pk_lpr))
-    alternatives = Alternative.objects.all()
+def load_alternative_vectors(alternative_ids):
+    """
+    {alternative_id: [vectors]} of the alternatives, loaded with a single query.
+    """
+    vectors = defaultdict(list)
+    for vector in Vector.objects.filter(alternative_id__in=alternative_ids).select_related('mark__criteria'):
+        vectors[vector.alternative_id].append(vector)
+    return vectors
 
-    compare_list = []
-    for first_alternative, second_alternative in itertools.combinations(alternatives, 2):
-        compare_list.append({'first': first_alternative, 'second': second_alternative})
 
-    CompareFormSet = formset_factory(AltCompareForm)
+def alt_compare(request, pk_lpr):
+    obj_lpr = LPR.objects.get(id=pk_lpr)
+    alternatives = list(Alternative.objects.order_by('id'))
+
+    pair_count = len(alternatives) * (len(alternatives) - 1) // 2
+    page = Paginator(range(pair_count), settings.ALT_COMPARE_PAGE_SIZE).get_page(request.GET.get('page'))
+    pairs = list(itertools.islice(
+        itertools.combinations(alternatives, 2), page.object_list.start, page.object_list.stop
+    ))
+    page_pairs = {(first.id, second.id) for first, second in pairs}
+    # Inferred comparisons are not asked for. Pages keep their pairs, so the ones
+    # inferred while answering never shift an unanswered pair off its page.
+    inferred = read_inferred_pairs(obj_lpr, list(page_pairs))
+    pairs = [(first, second) for first, second in pairs if (first.id, second.id) not in inferred]
+
+    page_ids = {alternative.id for pair in pairs for alternative in pair}
+    results = read_pair_results(obj_lpr, [(first.id, second.id) for first, second in pairs])
 
     formset_initial = []
-    for item in compare_list:
-        pair_initial = {'first_alternative': item['first'],
-                        'second_alternative': item['second']
+    for first, second in pairs:
+        pair_initial = {'first_alternative': first,
+                        'second_alternative': second,
+                        'first_id': first.id,
+                        'second_id': second.id
                         }
-        try:
-            pair = pair_compares.get(
-                first_alternative=item['first'],
-                second_alternative=item['second']
-            )
-        except PairCompare.DoesNotExist:
-            pair = None
-
-        if pair:
-            pair_initial['compare'] = pair.result
+        if results.get((first.id, second.id)):
+            pair_initial['compare'] = results[(first.id, second.id)]
         formset_initial.append(pair_initial)
 
-    _formset = CompareFormSet(initial=formset_initial, prefix='compare')
-
-    if request.method == "POST":
-        new_formset = CompareFormSet(request.POST, initial=formset_initial, prefix='compare')
-        if new_formset.is_valid():
-            for form in new_formset:
-                if form.is_valid():
-                    if form.cleaned_data.get('compare'):
-                        pair_object, created = PairCompare.objects.get_or_create(
-                            first_alternative=form.first_alternative,
-                            second_alternative=form.second_alternative,
-                            lpr=obj_lpr)
-                        pair_object.result = form.cleaned_data['compare']
-                        pair_object.save()
-
-            return redirect('lpr-list')
+    CompareFormSet = formset_factory(AltCompareForm, extra=0)
+    vectors = SimpleLazyObject(lambda: load_alternative_vectors(page_ids))
+    formset = CompareFormSet(request.POST or None, initial=formset_initial, prefix='compare',
+                             form_kwargs={'vectors': vectors})
+
+    if request.method == "POST" and formset.is_valid():
+        # Forms are matched to pairs by the ids they carry: pairs inferred since
+        # the page was rendered are left out of it now, so positions may differ.
+        answers = {
+            (form.cleaned_data['first_id'], form.cleaned_data['second_id']): form.cleaned_data['compare']
+            for form in formset
+            if form.cleaned_data.get('compare')
+            and (form.cleaned_data.get('first_id'), form.cleaned_data.get('second_id')) in page_pairs
+        }
+        stored = read_pair_results(obj_lpr, list(answers)) if answers else {}
+        cells = {
+            pair: result for pair, result in answers.items()
+            if stored.get(pair) != result or pair in inferred
+        }
+        if cells:
+            with transaction.atomic():
+                store_pair_results(obj_lpr, cells)
+                # A single new answer only extends the inferences; a batch or a
+                # changed answer recomputes the closure once.
+                if len(cells) == 1 and not any(stored.get(pair) for pair in cells):
+                    (first_id, second_id), result = next(iter(cells.items()))
+                    infer_after_answer(obj_lpr, first_id, second_id, result)
+                else:
+                    infer_closure(obj_lpr)
+
+        if page.has_next():
+            return redirect('%s?page=%d' % (reverse('start-incidence', args=[obj_lpr.id]), page.next_page_number()))
+        return redirect('lpr-list')
 
     return render(request, 'incidence/decisions/alt_compare.html', {
-        'formset': _formset,
+        'formset': formset,
+        'page': page,
         "alternatives": alternatives,
-        "lpr": LPR.objects.get(id=pk_lpr)
+        "lpr": obj_lpr
     })
 
 
+def incidence_matrix_context(obj_lpr):
+    alternatives = list(Alternative.objects.all())
+
+    nodes_dict = dict(enumerate(alternatives))
+    adjacency = load_preference_graph(obj_lpr, [alternative.id for alternative in alternatives])
+    incidence_matrix = incidence_from_adjacency(adjacency)
+    return {
+        'incidence_matrix': IncidenceRows(incidence_matrix),
+        'nodes_dict': nodes_dict,
+        'result': [nodes_dict[number] for number in pareto_best_rows(incidence_matrix)],
+    }
+
+
 def create_incidence_matrix(request, pk_lpr):
     obj_lpr = LPR.objects.get(id=pk_lpr)
-    pair_compares = PairCompare.objects.filter(lpr=LPR.objects.get(id=pk_lpr))
-    alternatives = Alternative.objects.all()
-    len_alternatives = len(alternatives)
-
-    nodes_dict = {}
-    nodes = []
-    edges = []
-    result = []
-
-    for i in range(0, len_alternatives):
-        nodes.append(i)
-        nodes_dict[alternatives[i].name] = i
-
-    inv_nodes_dict = {v: k for k, v in nodes_dict.items()}
-
-    print(nodes_dict)
-
-    for pair in pair_compares:
-        node1 = nodes_dict[pair.first_alternative.name]
-        node2 = nodes_dict[pair.second_alternative.name]
-        if pair.result == '>':
-            edges.append([node1, node2])
-        if pair.result == '<':
-            edges.append([node2, node1])
-        if pair.result == '=':
-            edges.append([node1, node2])
-            edges.append([node2, node1])
-
-    print(edges)
-
-    G = nx.DiGraph()
-    G.add_nodes_from(nodes)
-    G.add_edges_from(edges)
-
-    incidence_matrix = -nx.incidence_matrix(G, oriented=True)  # this returns a scipy sparse matrix
-
-    array_incidence_matrix = incidence_matrix.toarray()
-
-    for number in range(0, len(array_incidence_matrix)):
-        row = array_incidence_matrix[number]
-        if all(i >= 0 for i in row):
-            result.append(inv_nodes_dict[number])
-
-    return render(request, 'incidence/decisions/incidence_matrix.html', {
-        'incidence_matrix': array_incidence_matrix,
-        'nodes_dict': inv_nodes_dict,
-        'result': result,
-        'lpr': LPR.objects.get(id=pk_lpr)
+    context = cached_for_lpr('incidence-matrix', obj_lpr, lambda: incidence_matrix_context(obj_lpr))
+    return render(request, 'incidence/decisions/incidence_matrix.html', dict(context, lpr=obj_lpr))
+
+
+def get_pareto_front(request):
+    if request.method == "POST":
+        assign_pareto_layers()
+        return redirect(reverse_lazy('alternative-list') + '?ordering=pareto_layer')
+    return render(request, 'SMART/decisions/pareto_front.html', {
+        "alternatives": pareto_front_alternatives(),
+        "criterias": Criteria.objects.exclude(optimal_type__isnull=True).exclude(optimal_type='')
+    })
+
+
+def get_smart_ranking(request):
+    top = request.GET.get('top', '')
+    k = None if top == 'all' else int(top) if top.isdigit() else settings.SMART_RANKING_TOP
+    ranking = rank_alternatives(k=k)
+    alternatives = Alternative.objects.in_bulk(ranking.alternative_ids.tolist())
+    return render(request, 'SMART/decisions/smart_ranking.html', {
+        "ranking": [
+            (alternatives[pk], round(score, 2))
+            for pk, score in zip(ranking.alternative_ids.tolist(), ranking.scores.tolist())
+        ],
+        "criterias": Criteria.objects.all(),
+        "top": k
+    })
+
+
+def scenario_weights(scenarios, criterias):
+    """
+    scenarios x criteria weight array of [{"name": ..., "weights": {criteria_id: weight}}]
+    scenarios. Criterias a scenario leaves out keep their stored weight.
+    """
+    stored = current_weights(criterias)
+    columns = {str(criteria.id): column for column, criteria in enumerate(criterias)}
+    weights = []
+    for scenario in scenarios:
+        row = list(stored)
+        for criteria_id, weight in scenario.get('weights', {}).items():
+            if str(criteria_id) not in columns:
+                raise ValueError('Unknown criteria %s' % criteria_id)
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight) \
+                    or weight < 0:
+                raise ValueError('Weight of criteria %s must be a non-negative number' % criteria_id)
+            row[columns[str(criteria_id)]] = weight
+        weights.append(row)
+    return weights
+
+
+@require_POST
+def score_weight_scenarios(request):
+    """
+    What-if SMART rankings of a JSON batch of weight scenarios, nothing persisted:
+    {"top": 10, "scenarios": [{"name": "cost first", "weights": {"3": 50, "4": 10}}]}
+    The endpoint authenticates by session, so scripted clients send the CSRF
+    token in the X-CSRFToken header.
+    """
+    try:
+        payload = json.loads(request.body.decode('utf-8'))
+        scenarios = payload['scenarios']
+        top = payload.get('top')
+        if not isinstance(scenarios, list) or not all(isinstance(scenario, dict) for scenario in scenarios):
+            raise ValueError('scenarios must be a list of objects')
+        if len(scenarios) > settings.SMART_MAX_SCENARIOS:
+            raise ValueError('At most %d scenarios per request' % settings.SMART_MAX_SCENARIOS)
+        if top is not None and (isinstance(top, bool) or not isinstance(top, int) or top < 0):
+            raise ValueError('top must be a non-negative integer')
+        matrix = decision_matrix()
+        weights = scenario_weights(scenarios, matrix.criterias)
+    except (ValueError, KeyError, TypeError, AttributeError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    rankings = score_scenarios(weights, k=top, matrix=matrix) if scenarios else []
+    return JsonResponse({
+        'criterias': [criteria.id for criteria in matrix.criterias],
+        'scenarios': [
+            {
+                'name': scenario.get('name'),
+                'weights': row,
+                'alternative_ids': ranking.alternative_ids.tolist(),
+                'scores': ranking.scores.round(4).tolist(),
+            }
+            for scenario, row, ranking in zip(scenarios, weights, rankings)
+        ]
+    })
+
+
+def get_rank_stability(request):
+    form = RankStabilityForm(request.GET or None, initial={
+        'samples': settings.RANK_STABILITY_SAMPLES, 'method': DIRICHLET
+    })
+    report = []
+    if form.is_valid():
+        report = stability_report(rank_stability(**form.cleaned_data))
+    alternatives = Alternative.objects.in_bulk([row[0] for row in report])
+    return render(request, 'SMART/decisions/rank_stability.html', {
+        "form": form,
+        "report": [
+            (alternatives[pk], round(best * 100, 1), round(mean, 1), low, high)
+            for pk, best, mean, (low, high) in report
+        ],
+        "criterias": Criteria.objects.all()
+    })
+
+
+def result_matrix_etag(request, pk_lpr):
+    return lprs_etag('result-matrix', 'data_version', lpr_id=int(pk_lpr))
+
+
+def result_matrix_payload(obj_lpr):
+    """
+    The LPR's pairwise matrix as base64 of its row-major int8 result codes,
+    rows and columns following alternative_ids; signs maps codes to results.
+    seq is read before the matrix, so following the change feed from it never
+    skips a change the matrix misses.
+    """
+    seq = last_change(obj_lpr.id)
+    alternative_ids = list(Alternative.objects.order_by('id').values_list('id', flat=True))
+    matrix = read_pair_matrix(obj_lpr, alternative_ids)
+    return {
+        'lpr': obj_lpr.id,
+        'seq': seq,
+        'alternative_ids': alternative_ids,
+        'signs': RESULT_SIGNS.tolist(),
+        'matrix': base64.b64encode(matrix.tobytes()).decode('ascii'),
+    }
+
+
+@require_GET
+@condition(etag_func=result_matrix_etag)
+def get_result_matrix_json(request, pk_lpr):
+    obj_lpr = get_object_or_404(LPR, id=pk_lpr)
+    return JsonResponse(cached_for_lpr('result-matrix-json', obj_lpr, lambda: result_matrix_payload(obj_lpr)))
+
+
+def group_results_etag(request):
+    return lprs_etag('group-results', 'rank', 'data_version')
+
+
+@require_GET
+@condition(etag_func=group_results_etag)
+def get_group_results_json(request):
+    return JsonResponse({
+        'lprs': list(LPR.objects.order_by('id').values('id', 'name', 'rank')),
+        'alternatives': list(Alternative.objects.order_by('id').values('id', 'name', 'group_weight')),
+        'results': list(Result.objects.order_by('lpr_id', 'alternative_id').values_list(
+            'lpr_id', 'alternative_id', 'alternative_weight', 'rank'
+        )),
+    })
+
+
+def lpr_ranks_etag(request):
+    return lprs_etag('lpr-ranks', 'name', 'rank')
+
+
+@require_GET
+@condition(etag_func=lpr_ranks_etag)
+def get_lpr_ranks_json(request):
+    return JsonResponse({'lprs': list(LPR.objects.order_by('id').values('id', 'name', 'rank'))})
+
+
+@require_GET
+def get_pair_changes_json(request, pk_lpr):
+    """
+    Comparisons of the LPR written after ?since=<seq>, oldest first, as
+    [seq, first_id, second_id, result, inferred] with a None result for a deleted
+    one. Once the feed was pruned past since, answers 410 with resync_required:
+    the client reads seq, reloads the matrix and continues from that seq.
+    """
+    obj_lpr = get_object_or_404(LPR, id=pk_lpr)
+    since = request.GET.get('since', '')
+    if not since.isdigit():
+        return JsonResponse({'error': 'since must be a non-negative integer'}, status=400)
+    found = pair_changes_since(obj_lpr, int(since), settings.PAIR_CHANGES_PAGE_SIZE)
+    if found is None:
+        return JsonResponse({'resync_required': True, 'seq': last_change(obj_lpr.id)}, status=410)
+    changes, more = found
+    return JsonResponse({
+        'changes': changes,
+        'seq': changes[-1][0] if changes else int(since),
+        'more': more,
     })
@@ -100,6 +100,26 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+# Rendered matrix tables are keyed by the LPR data versions, so stale fragments
+# are never read again and only need to be culled.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 200,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 
@@ -145,3 +165,69 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+
+# LPR competence ranks
+# Power iteration stops once the L1 change of the normalized competence
+# vector drops below the tolerance, or after the maximum number of iterations.
+
+LPR_RANK_TOLERANCE = 1e-6
+LPR_RANK_MAX_ITERATIONS = 1000
+
+
+# Pairwise comparison of alternatives
+# Number of alternative pairs shown on one page of the comparison formset.
+
+ALT_COMPARE_PAGE_SIZE = 200
+
+
+# Packed pair matrices
+# When enabled, every LPR's pairwise matrix is also kept as a 2-bit-per-cell
+# blob that the results and incidence pages read instead of the PairCompare rows.
+
+PACKED_PAIR_MATRIX = False
+
+
+# SMART scoring
+# Alternatives are scored in blocks of SMART_CHUNK_SIZE to bound memory, and the
+# ranking page shows the SMART_RANKING_TOP best unless asked for more.
+
+SMART_CHUNK_SIZE = 65536
+SMART_RANKING_TOP = 100
+
+
+# What-if SMART scenarios
+# Maximum number of weight vectors scored by one request to the scenarios API.
+# Nothing is persisted; the decision matrix is cached in each process.
+
+SMART_MAX_SCENARIOS = 1000
+
+
+# Rank stability
+# Number of weight vectors sampled around the criteria weights, and the number
+# of worker processes sharing them; 1 scores every sample in the web process.
+
+RANK_STABILITY_SAMPLES = 10000
+RANK_STABILITY_WORKERS = 1
+
+
+# Result cache
+# Matrices and winners computed by the LPR result pages are kept in each process,
+# keyed by the LPR's data version; the least recently used beyond this are evicted.
+
+RESULT_CACHE_SIZE = 256
+
+
+# Cache notifications
+# Writes NOTIFY this PostgreSQL channel and, when the listener is enabled, every
+# WSGI worker evicts its cached values for the LPR or criteria named in them.
+
+CACHE_NOTIFY_CHANNEL = 'decisions_cache'
+CACHE_NOTIFY_LISTENER = True
+
+
+# Comparison change feed
+# Number of changes returned by one request to the changes API, and the number
+# of newest changes prune_pair_changes keeps; older clients have to resync.
+
+PAIR_CHANGES_PAGE_SIZE = 5000
+PAIR_CHANGES_KEPT = 1000000
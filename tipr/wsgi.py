@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tipr.settings")
 
 application = get_wsgi_application()
+
+from decisions.notify import start_listener  # noqa: E402
+
+start_listener()